@@ -4,12 +4,16 @@
 # Copyright (c) Microsoft. All rights reserved.
 # Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
 
-from typing import List
+from collections import Counter
+from typing import Dict, List, Optional
 
+import email.utils
 import logging
+import random
 import sys
 import requests
 import time
+import urllib3
 import swagger_client as cris_client
 
 
@@ -29,6 +33,168 @@ RECORDINGS_BLOB_URI = "<Your SAS Uri to the recording>"
 ADAPTED_ACOUSTIC_ID = None  # guid of a custom acoustic model
 ADAPTED_LANGUAGE_ID = None  # guid of a custom language model
 
+# Maximum number of attempts of a request that fails with a transient error
+MAX_REQUEST_ATTEMPTS = 5
+
+
+def parse_retry_after(headers) -> Optional[float]:
+    """
+    Return the number of seconds the `Retry-After` header in `headers` asks to wait, or None if
+    the header is missing or invalid. Both the delay-seconds and the HTTP-date format are supported.
+    """
+    value = (headers or {}).get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+# A condensed version of samples/batch/python/python-client/retry.py that decides which requests
+# to retry and how long to wait in the same way. Unlike retry.py it has no retry budget, a single
+# circuit breaker for all hosts without a half-open trial request, and no metrics.
+class RetryingRestClient:
+    """
+    Wraps the `rest_client` of a generated `ApiClient` to retry requests that failed with a
+    transient error, such as throttling (429), an unavailable service (5xx), or a failed
+    connection.
+
+    Retries wait with exponential backoff and jitter, or as long as the `Retry-After` header
+    asks for. Requests that create resources are only retried after throttling, so that they are
+    not processed twice. After `failure_threshold` consecutive failures the circuit opens, and
+    requests fail immediately for `reset_timeout` seconds instead of adding load to the service.
+    The counters in `stats` record requests, retries, and rejected requests.
+    """
+
+    RETRYABLE_STATUSES = (408, 429, 500, 502, 503, 504)
+
+    def __init__(self, rest_client, max_attempts: int = 5, base_delay: float = 0.5, max_delay: float = 30.0,
+                 failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self._rest_client = rest_client
+        self._max_attempts = max_attempts
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._failures = 0
+        self._open_until = 0.0
+        self.stats = Counter()
+
+    def __getattr__(self, name):
+        return getattr(self._rest_client, name)
+
+    def request(self, method, url, *args, **kwargs):
+        self.stats["requests"] += 1
+        for attempt in range(self._max_attempts):
+            if time.monotonic() < self._open_until:
+                self.stats["rejected"] += 1
+                raise cris_client.rest.ApiException(status=503, reason="circuit breaker is open")
+            try:
+                response = self._rest_client.request(method, url, *args, **kwargs)
+            except (cris_client.rest.ApiException, urllib3.exceptions.HTTPError) as exc:
+                # the status is None or 0 if the request failed without a response, such as on a
+                # connection or SSL error
+                status = getattr(exc, "status", None)
+                if not status or (status != 429 and status in self.RETRYABLE_STATUSES):
+                    self._failures += 1
+                    if self._failures >= self._failure_threshold:
+                        self._open_until = time.monotonic() + self._reset_timeout
+                        self._failures = 0
+                else:
+                    self._failures = 0
+
+                retryable = status == 429 or (method != "POST" and (not status or status in self.RETRYABLE_STATUSES))
+                if not retryable or attempt + 1 == self._max_attempts:
+                    raise
+
+                delay = random.uniform(0, min(self._max_delay, self._base_delay * 2 ** attempt))
+                retry_after = parse_retry_after(getattr(exc, "headers", None))
+                if retry_after is not None:
+                    delay = max(delay, retry_after)
+                logging.info("Retrying {} request in {:.1f} seconds after error: {}".format(method, delay, exc))
+                self.stats["retries"] += 1
+                time.sleep(delay)
+            else:
+                self._failures = 0
+                return response
+
+    def GET(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def HEAD(self, url, **kwargs):
+        return self.request("HEAD", url, **kwargs)
+
+    def OPTIONS(self, url, **kwargs):
+        return self.request("OPTIONS", url, **kwargs)
+
+    def DELETE(self, url, **kwargs):
+        return self.request("DELETE", url, **kwargs)
+
+    def POST(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def PUT(self, url, **kwargs):
+        return self.request("PUT", url, **kwargs)
+
+    def PATCH(self, url, **kwargs):
+        return self.request("PATCH", url, **kwargs)
+
+
+class TranscriptionTracker:
+    """
+    Keeps an in-memory index of the transcriptions created by this client.
+
+    Only the tracked transcriptions are requested from the service, and completed transcriptions
+    are not requested again. The number of transcriptions per status is maintained
+    incrementally, so it does not require scanning all transcriptions of the subscription.
+    """
+
+    def __init__(self, transcription_api):
+        self._transcription_api = transcription_api
+        self._transcriptions: Dict[str, cris_client.Transcription] = {}
+        self._status_counts = Counter()
+
+    def add(self, transcription_id: str):
+        """Start tracking the transcription with id `transcription_id`."""
+        self._transcriptions[transcription_id] = None
+        self._status_counts[None] += 1
+
+    def count(self, status: str) -> int:
+        """Return the number of tracked transcriptions with status `status`."""
+        return self._status_counts[status]
+
+    def is_completed(self, transcription_id: str) -> bool:
+        """Return whether the transcription with id `transcription_id` has succeeded or failed."""
+        transcription = self._transcriptions[transcription_id]
+        return transcription is not None and transcription.status in ("Failed", "Succeeded")
+
+    def refresh(self) -> List[cris_client.Transcription]:
+        """
+        Request the status of all tracked transcriptions that are not completed yet, and return
+        the transcriptions whose status has changed.
+        """
+        changed = []
+        for transcription_id, cached in list(self._transcriptions.items()):
+            if self.is_completed(transcription_id):
+                continue
+
+            transcription = self._transcription_api.get_transcription(transcription_id)
+            self._transcriptions[transcription_id] = transcription
+
+            old_status = cached.status if cached is not None else None
+            if transcription.status != old_status:
+                self._status_counts[old_status] -= 1
+                self._status_counts[transcription.status] += 1
+                changed.append(transcription)
+
+        return changed
+
 
 def transcribe():
     logging.info("Starting transcription client...")
@@ -41,6 +207,9 @@ def transcribe():
     # create the client object and authenticate
     client = cris_client.ApiClient(configuration)
 
+    # retry requests that failed with a transient error
+    client.rest_client = RetryingRestClient(client.rest_client, max_attempts=MAX_REQUEST_ATTEMPTS)
+
     # create an instance of the transcription api class
     transcription_api = cris_client.CustomSpeechTranscriptionsApi(api_client=client)
 
@@ -84,42 +253,33 @@ def transcribe():
 
     logging.info("Checking status.")
 
+    tracker = TranscriptionTracker(transcription_api)
+    tracker.add(created_transcription)
+
     completed = False
 
     while not completed:
-        running, not_started = 0, 0
-
-        # get all transcriptions for the user
-        transcriptions: List[cris_client.Transcription] = transcription_api.get_transcriptions()
-
-        # for each transcription in the list we check the status
-        for transcription in transcriptions:
-            if transcription.status in ("Failed", "Succeeded"):
-                # we check to see if it was the transcription we created from this client
-                if created_transcription != transcription.id:
-                    continue
-
-                completed = True
-
-                if transcription.status == "Succeeded":
-                    results_uri = transcription.results_urls["channel_0"]
-                    results = requests.get(results_uri)
-                    logging.info("Transcription succeeded. Results: ")
-                    logging.info(results.content.decode("utf-8"))
-                else:
-                    logging.info("Transcription failed :{}.".format(transcription.status_message))
-                    break
-            elif transcription.status == "Running":
-                running += 1
-            elif transcription.status == "NotStarted":
-                not_started += 1
+        # only transcriptions whose status has changed since the last request are returned
+        for transcription in tracker.refresh():
+            if transcription.status == "Succeeded":
+                results_uri = transcription.results_urls["channel_0"]
+                results = requests.get(results_uri)
+                logging.info("Transcription succeeded. Results: ")
+                logging.info(results.content.decode("utf-8"))
+            elif transcription.status == "Failed":
+                logging.info("Transcription failed :{}.".format(transcription.status_message))
+
+        completed = tracker.is_completed(created_transcription)
 
         logging.info("Transcriptions status: "
                 "completed (this transcription): {}, {} running, {} not started yet".format(
-                    completed, running, not_started))
+                    completed, tracker.count("Running"), tracker.count("NotStarted")))
+
+        if not completed:
+            # wait for 5 seconds
+            time.sleep(5)
 
-        # wait for 5 seconds
-        time.sleep(5)
+    logging.info("Request statistics: {}".format(dict(client.rest_client.stats)))
 
     input("Press any key...")
 
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+
+import asyncio
+import types
+import swagger_client as cris_client
+
+try:
+    import aiohttp
+except ImportError:
+    print("""
+    Importing aiohttp failed. The asynchronous batch client requires aiohttp, which can be
+    installed with the command `pip install aiohttp`.
+    """)
+    import sys
+    sys.exit(1)
+
+
+class AsyncTranscriptionClient:
+    """
+    Asynchronous client for the transcription operations of the Speech to Text API v3.0.
+
+    The generated `swagger_client` package is used to serialize requests and deserialize
+    responses into its model classes, while the requests are sent with `aiohttp` over a pool of
+    up to `max_connections` connections. Use the client as an asynchronous context manager:
+
+        async with AsyncTranscriptionClient(configuration) as client:
+            transcription_id = await client.create_transcription(transcription_definition)
+    """
+
+    def __init__(self, configuration, max_connections=100):
+        self._host = configuration.host
+        self._headers = {"Ocp-Apim-Subscription-Key": configuration.api_key["Ocp-Apim-Subscription-Key"]}
+        self._max_connections = max_connections
+        self._api_client = cris_client.ApiClient(configuration)
+        self._session = None
+        self.requests = 0
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self._max_connections)
+        self._session = aiohttp.ClientSession(connector=connector, headers=self._headers)
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        await self._session.close()
+
+    async def _request(self, method, url, response_type=None, body=None):
+        if not url.startswith(self._host):
+            url = self._host + url
+        json_body = self._api_client.sanitize_for_serialization(body) if body is not None else None
+
+        self.requests += 1
+        async with self._session.request(method, url, json=json_body) as response:
+            data = await response.text()
+            if not 200 <= response.status <= 299:
+                exc = cris_client.rest.ApiException(status=response.status, reason=response.reason)
+                exc.body = data
+                exc.headers = response.headers
+                raise exc
+
+            result = None
+            if response_type is not None:
+                # the generated client deserializes from an object with the response text as `data`
+                result = self._api_client.deserialize(types.SimpleNamespace(data=data), response_type)
+            return result, response.status, response.headers
+
+    async def create_transcription(self, transcription):
+        """
+        Create the transcription `transcription` and return the id of the new transcription.
+        """
+        _, _, headers = await self._request("POST", "/transcriptions", body=transcription)
+        return headers["location"].split("/")[-1]
+
+    async def get_transcription(self, transcription_id):
+        transcription, _, _ = await self._request("GET", f"/transcriptions/{transcription_id}", "Transcription")
+        return transcription
+
+    async def get_transcriptions(self):
+        transcriptions, _, _ = await self._request("GET", "/transcriptions", "PaginatedTranscriptions")
+        return transcriptions
+
+    async def get_transcription_files(self, transcription_id):
+        files, _, _ = await self._request("GET", f"/transcriptions/{transcription_id}/files", "PaginatedFiles")
+        return files
+
+    async def delete_transcription(self, transcription_id):
+        await self._request("DELETE", f"/transcriptions/{transcription_id}")
+
+    async def paginate(self, paginated_object):
+        """
+        Return an asynchronous generator over all items of the array that the paginated object
+        `paginated_object` is part of. The next page is requested while the current page is
+        consumed.
+        """
+        typename = type(paginated_object).__name__
+        page = paginated_object
+        while True:
+            next_page = None
+            if page.next_link:
+                next_page = asyncio.ensure_future(self._request("GET", page.next_link, typename))
+            try:
+                for item in page.values:
+                    yield item
+            except BaseException:
+                if next_page is not None:
+                    next_page.cancel()
+                raise
+
+            if next_page is None:
+                return
+            page, _, _ = await next_page
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+
+"""
+Measures the throughput of the asynchronous batch client against the local mock server. Each
+job creates a transcription, polls it until it has succeeded, lists its files and deletes it.
+"""
+
+import argparse
+import asyncio
+import time
+import swagger_client as cris_client
+
+from async_client import AsyncTranscriptionClient
+from mock_server import MockSpeechService, start_mock_server
+
+
+async def _run_job(client, semaphore, poll_interval):
+    async with semaphore:
+        transcription_definition = cris_client.Transcription(
+            display_name="Benchmark", locale="en-US", content_urls=["https://example.com/audio.wav"])
+        transcription_id = await client.create_transcription(transcription_definition)
+        while (await client.get_transcription(transcription_id)).status != "Succeeded":
+            await asyncio.sleep(poll_interval)
+        async for _ in client.paginate(await client.get_transcription_files(transcription_id)):
+            pass
+        await client.delete_transcription(transcription_id)
+
+
+async def benchmark(jobs, concurrency, latency, job_duration, poll_interval):
+    server = start_mock_server(MockSpeechService(latency=latency, job_duration=job_duration))
+
+    configuration = cris_client.Configuration()
+    configuration.api_key["Ocp-Apim-Subscription-Key"] = "benchmark"
+    configuration.host = server.base_url
+
+    try:
+        async with AsyncTranscriptionClient(configuration, max_connections=concurrency) as client:
+            semaphore = asyncio.Semaphore(concurrency)
+            start = time.monotonic()
+            await asyncio.gather(*(_run_job(client, semaphore, poll_interval) for _ in range(jobs)))
+            elapsed = time.monotonic() - start
+    finally:
+        server.shutdown()
+
+    print(f"{jobs} jobs with {concurrency} concurrent jobs in {elapsed:.2f}s: "
+          f"{jobs / elapsed:.1f} jobs/s, {client.requests / elapsed:.1f} requests/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--jobs", type=int, default=2000, help="number of transcription jobs")
+    parser.add_argument("--concurrency", type=int, default=500, help="number of concurrent jobs")
+    parser.add_argument("--latency", type=float, default=0.05, help="latency of the mock in seconds")
+    parser.add_argument("--job-duration", type=float, default=1.0, help="duration of a transcription in seconds")
+    parser.add_argument("--poll-interval", type=float, default=0.5, help="status polling interval in seconds")
+    args = parser.parse_args()
+
+    asyncio.run(benchmark(args.jobs, args.concurrency, args.latency, args.job_duration, args.poll_interval))
+
+
+if __name__ == "__main__":
+    main()
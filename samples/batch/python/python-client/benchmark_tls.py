@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+
+"""
+Measures the cost of TLS handshakes for the batch client against the local mock server over
+HTTPS. Requests are sent half through the generated API client and half through `requests`,
+once with a new connection for every request, once over the shared connection pool of
+transport.py, and once over HTTP/2 if httpx is installed. A self-signed certificate is created
+with the `openssl` command line tool.
+"""
+
+import argparse
+import concurrent.futures
+import os
+import ssl
+import subprocess
+import tempfile
+import time
+import requests
+import swagger_client as cris_client
+
+from mock_server import MockSpeechService, start_mock_server
+from transport import Http2RestClient, create_pool_manager, httpx, share_pool_manager
+
+
+def _create_certificate(directory):
+    certificate = os.path.join(directory, "cert.pem")
+    key = os.path.join(directory, "key.pem")
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-keyout", key, "-out", certificate,
+                    "-days", "1", "-subj", "/CN=localhost", "-addext", "subjectAltName=IP:127.0.0.1"],
+                   check=True, capture_output=True)
+    return certificate, key
+
+
+def _configuration(base_url, certificate):
+    configuration = cris_client.Configuration()
+    configuration.api_key["Ocp-Apim-Subscription-Key"] = "benchmark"
+    configuration.host = base_url
+    configuration.ssl_ca_cert = certificate
+    return configuration
+
+
+def _unpooled(configuration, certificate):
+    # a new API client and a plain requests.get for every request, as in simple clients
+    def request(index):
+        if index % 2:
+            cris_client.DefaultApi(cris_client.ApiClient(configuration)).get_transcriptions()
+        else:
+            requests.get(f"{configuration.host}/transcriptions", verify=certificate, timeout=30).raise_for_status()
+    return request
+
+
+def _pooled(configuration, certificate, pool_size):
+    pool_manager = create_pool_manager(pool_size, ca_certs=certificate)
+    client = cris_client.ApiClient(configuration)
+    session = requests.Session()
+    share_pool_manager(pool_manager, api_client=client, session=session)
+    api = cris_client.DefaultApi(client)
+
+    def request(index):
+        if index % 2:
+            api.get_transcriptions()
+        else:
+            # verify is passed with each request, because REQUESTS_CA_BUNDLE overrides session.verify
+            session.get(f"{configuration.host}/transcriptions", verify=certificate, timeout=30).raise_for_status()
+    return request
+
+
+def _http2(configuration, pool_size):
+    client = cris_client.ApiClient(configuration)
+    client.rest_client = Http2RestClient(configuration, max_connections=pool_size)
+    api = cris_client.DefaultApi(client)
+    return lambda index: api.get_transcriptions()
+
+
+def _measure(name, service, request, requests_count, concurrency):
+    connections = service.connections
+    start = time.monotonic()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(request, range(requests_count)))
+    elapsed = time.monotonic() - start
+    print(f"{name:>10}: {requests_count / elapsed:8.1f} requests/s, "
+          f"{service.connections - connections} TLS handshakes for {requests_count} requests")
+
+
+def benchmark(requests_count, concurrency, latency):
+    with tempfile.TemporaryDirectory() as directory:
+        certificate, key = _create_certificate(directory)
+        ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        ssl_context.load_cert_chain(certificate, key)
+
+        service = MockSpeechService(latency=latency, page_size=1)
+        server = start_mock_server(service, ssl_context=ssl_context)
+        configuration = _configuration(server.base_url, certificate)
+        try:
+            _measure("unpooled", service, _unpooled(configuration, certificate), requests_count, concurrency)
+            _measure("pooled", service, _pooled(configuration, certificate, concurrency), requests_count, concurrency)
+            if httpx is not None:
+                # the mock server only speaks HTTP/1.1, so this shows the overhead of the client
+                _measure("httpx", service, _http2(configuration, concurrency), requests_count, concurrency)
+        finally:
+            server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000, help="number of requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16, help="number of concurrent requests")
+    parser.add_argument("--latency", type=float, default=0.0, help="latency of the mock in seconds")
+    args = parser.parse_args()
+    benchmark(args.requests, args.concurrency, args.latency)
+
+
+if __name__ == "__main__":
+    main()
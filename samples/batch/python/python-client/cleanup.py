@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+
+import concurrent.futures
+import datetime
+import fnmatch
+import heapq
+import itertools
+import logging
+import threading
+import time
+import swagger_client as cris_client
+import urllib3
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket that limits the rate of operations to `rate` per second, allowing
+    bursts of up to `capacity` operations.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self._rate = rate
+        self._capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Block until a token is available and take it.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self._rate
+            time.sleep(wait)
+
+
+def _as_utc(value):
+    if isinstance(value, str):
+        # ISO 8601 as returned by the service, which older Python versions do not parse with a "Z"
+        value = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        return value.replace(tzinfo=datetime.timezone.utc)
+    return value
+
+
+class TranscriptionFilter:
+    """
+    Selects transcriptions by status, age and display name.
+
+    Only transcriptions whose status is in `statuses`, which were created more than `older_than`
+    (a `datetime.timedelta`) ago, and whose display name matches the shell-style pattern
+    `display_name` are selected. Criteria that are None are not checked.
+    """
+
+    def __init__(self, statuses=("Succeeded", "Failed"), older_than=None, display_name=None):
+        self.statuses = statuses
+        self.older_than = older_than
+        self.display_name = display_name
+
+    def __call__(self, transcription):
+        if self.statuses is not None and transcription.status not in self.statuses:
+            return False
+        if self.older_than is not None:
+            age = datetime.datetime.now(datetime.timezone.utc) - _as_utc(transcription.created_date_time)
+            if age < self.older_than:
+                return False
+        if self.display_name is not None and not fnmatch.fnmatchcase(transcription.display_name or "", self.display_name):
+            return False
+        return True
+
+
+class RetentionPolicy:
+    """
+    Declarative retention rules for transcriptions.
+
+    Completed transcriptions are deleted unless they are kept by a rule: the `keep_last` most
+    recently created transcriptions are kept, and only transcriptions created more than
+    `delete_older_than` (a `datetime.timedelta`) ago are deleted. With `keep_failed`, failed
+    transcriptions are kept for debugging, and with `display_name`, only transcriptions whose
+    display name matches the shell-style pattern are deleted. Rules that are None do not apply.
+    Transcriptions that have not completed are never deleted.
+
+    Pass the policy as `selector` to `bulk_delete`. The most recent transcriptions are found in a
+    single pass over the list with a heap of `keep_last` entries, so memory use does not depend on
+    the number of transcriptions.
+    """
+
+    def __init__(self, keep_last=None, delete_older_than=None, keep_failed=False, display_name=None):
+        self.keep_last = keep_last
+        self.delete_older_than = delete_older_than
+        self.keep_failed = keep_failed
+        self.display_name = display_name
+
+    def _deletable(self, transcription, now):
+        if transcription.status not in ("Succeeded", "Failed"):
+            return False
+        if self.keep_failed and transcription.status == "Failed":
+            return False
+        if self.delete_older_than is not None and now - _as_utc(transcription.created_date_time) < self.delete_older_than:
+            return False
+        if self.display_name is not None and not fnmatch.fnmatchcase(transcription.display_name or "", self.display_name):
+            return False
+        return True
+
+    def expired(self, transcriptions):
+        """
+        Iterate over the transcriptions of the iterable `transcriptions` that are to be deleted.
+
+        Transcriptions are yielded as soon as `keep_last` more recent ones have been seen, so the
+        list can be in any order.
+        """
+        now = datetime.datetime.now(datetime.timezone.utc)
+        # min-heap of (created, sequence number, transcription) of the most recent transcriptions
+        newest = []
+        for sequence, transcription in enumerate(transcriptions):
+            if self.keep_last:
+                entry = (_as_utc(transcription.created_date_time), sequence, transcription)
+                if len(newest) < self.keep_last:
+                    heapq.heappush(newest, entry)
+                    continue
+                # the oldest of the kept transcriptions and the new one is not among the most recent
+                transcription = heapq.heappushpop(newest, entry)[2]
+            if self._deletable(transcription, now):
+                yield transcription
+
+
+class DeletionSummary:
+    """
+    Counts of a bulk deletion.
+    """
+
+    def __init__(self):
+        self.scanned = 0
+        self.matched = 0
+        self.deleted = 0
+        self.failed = 0
+        self.started = time.monotonic()
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def throughput(self):
+        """Deletions per second."""
+        return self.deleted / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __str__(self):
+        return (f"scanned {self.scanned}, matched {self.matched}, deleted {self.deleted}, failed {self.failed} "
+                f"in {self.elapsed:.1f}s ({self.throughput:.1f} deletions/s)")
+
+
+def get_transcription_id(transcription):
+    """
+    Return the id of `transcription`, which is the last segment of its self link.
+    """
+    return transcription._self.split("/")[-1]
+
+
+def bulk_delete(api, transcriptions, selector=None, max_workers=8, rate=None, dry_run=False, progress_interval=10.0):
+    """
+    Delete the transcriptions of the iterable `transcriptions` that are selected by the callable
+    `selector` or by the `RetentionPolicy` `selector`, using a pool of `max_workers` threads.
+    `transcriptions` is consumed lazily, so deletion starts with the first page of a paginated
+    list and memory use stays bounded.
+
+    `rate` limits the number of delete requests per second. With `dry_run`, the selected
+    transcriptions are only counted. Progress is logged every `progress_interval` seconds.
+
+    Returns a `DeletionSummary`.
+    """
+    selector = selector if selector is not None else TranscriptionFilter()
+    bucket = TokenBucket(rate) if rate else None
+    summary = DeletionSummary()
+    last_progress = time.monotonic()
+
+    def scanned():
+        for transcription in transcriptions:
+            summary.scanned += 1
+            yield transcription
+
+    def selected():
+        if isinstance(selector, RetentionPolicy):
+            matches = selector.expired(scanned())
+        else:
+            matches = filter(selector, scanned())
+        for transcription in matches:
+            summary.matched += 1
+            yield get_transcription_id(transcription)
+
+    def delete(transcription_id):
+        if bucket is not None:
+            bucket.acquire()
+        logging.debug(f"Deleting transcription with id {transcription_id}")
+        api.delete_transcription(transcription_id)
+
+    if dry_run:
+        for _ in selected():
+            pass
+        logging.info(f"Dry run: {summary}")
+        return summary
+
+    ids = selected()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {}
+
+        def fill():
+            for transcription_id in itertools.islice(ids, 2 * max_workers - len(pending)):
+                pending[executor.submit(delete, transcription_id)] = transcription_id
+
+        fill()
+        while pending:
+            done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                transcription_id = pending.pop(future)
+                try:
+                    future.result()
+                    summary.deleted += 1
+                except (cris_client.rest.ApiException, urllib3.exceptions.HTTPError, OSError) as exc:
+                    logging.error(f"Could not delete transcription {transcription_id}: {exc}")
+                    summary.failed += 1
+
+            if time.monotonic() - last_progress >= progress_interval:
+                last_progress = time.monotonic()
+                logging.info(f"Deleting transcriptions: {summary}")
+            fill()
+
+    logging.info(f"Deleted transcriptions: {summary}")
+    return summary
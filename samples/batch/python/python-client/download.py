@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+
+import concurrent.futures
+import itertools
+import logging
+import os
+import requests
+from metrics import RESULT_BYTES_DOWNLOADED, RESULT_FILES_DOWNLOADED
+
+
+def create_session(pool_size):
+    """
+    Create a `requests.Session` that keeps up to `pool_size` connections per host alive.
+    """
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+# errors of a connection that may succeed when the download is retried
+_RETRIED_ERRORS = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+
+
+def _counted(chunks):
+    for chunk in chunks:
+        RESULT_BYTES_DOWNLOADED.inc(len(chunk))
+        yield chunk
+
+
+def _file_name(file_data):
+    # result file names may contain path separators
+    return file_data.name.replace("/", "_").replace("\\", "_")
+
+
+class ResultDownloader:
+    """
+    Downloads transcription result files in parallel over a pooled HTTP session.
+
+    Response bodies are streamed in chunks of `chunk_size` bytes, either to files in a directory
+    or to a caller-supplied sink, so results are never held in memory as a whole. Downloads to a
+    directory are resumable: complete files are skipped, and partially written files are continued
+    with a range request. A download to a sink that is interrupted is continued with a range request
+    after the bytes that the sink has received.
+    """
+
+    def __init__(self, session=None, max_workers=8, chunk_size=64 * 1024, retries=3, timeout=60):
+        self._session = session if session is not None else create_session(max_workers)
+        self._max_workers = max_workers
+        self._chunk_size = chunk_size
+        self._retries = retries
+        self._timeout = timeout
+
+    def download(self, files, directory=None, sink=None):
+        """
+        Download the content of each file in `files`, which are the file objects returned by
+        `get_transcription_files`.
+
+        The content is written to `directory`, unless `sink` is given. `sink(name, chunks)` is
+        called with the file name and an iterator over the chunks of its content, and must consume
+        the iterator. It is called from worker threads.
+
+        Returns a tuple `(downloaded, failed)` with the names of the downloaded and failed files.
+        Failed files can be downloaded later by calling this method again.
+        """
+        if (directory is None) == (sink is None):
+            raise ValueError("either directory or sink must be given")
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+        downloaded, failed = [], []
+        files = iter(files)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            pending = {}
+
+            def fill():
+                for file_data in itertools.islice(files, 2 * self._max_workers - len(pending)):
+                    future = executor.submit(self._download_file, file_data, directory, sink)
+                    pending[future] = _file_name(file_data)
+
+            fill()
+            while pending:
+                done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    name = pending.pop(future)
+                    try:
+                        future.result()
+                        downloaded.append(name)
+                        RESULT_FILES_DOWNLOADED.inc(outcome="downloaded")
+                    except (requests.RequestException, OSError) as exc:
+                        logging.error(f"Could not download {name}: {exc}")
+                        failed.append(name)
+                        RESULT_FILES_DOWNLOADED.inc(outcome="failed")
+                fill()
+
+        return downloaded, failed
+
+    def _download_file(self, file_data, directory, sink):
+        name = _file_name(file_data)
+        url = file_data.links.content_url
+        if sink is not None:
+            sink(name, self._stream_content(url, name))
+            return
+
+        for attempt in range(self._retries + 1):
+            try:
+                self._download_to_file(url, os.path.join(directory, name))
+                return
+            except _RETRIED_ERRORS as exc:
+                if attempt == self._retries:
+                    raise
+                logging.warning(f"Retrying download of {name} after error: {exc}")
+
+    def _stream_content(self, url, name):
+        # The sink has consumed the chunks before a failed attempt, so a retry continues with a range
+        # request after the delivered bytes instead of starting over.
+        offset = 0
+        for attempt in range(self._retries + 1):
+            headers = {"Range": f"bytes={offset}-"} if offset else {}
+            try:
+                with self._session.get(url, headers=headers, stream=True, timeout=self._timeout) as response:
+                    if response.status_code == 416:
+                        # all bytes have been delivered before the connection failed
+                        return
+                    response.raise_for_status()
+                    # the server may ignore the range request and send the whole file
+                    skip = offset if response.status_code != 206 else 0
+                    for chunk in _counted(response.iter_content(chunk_size=self._chunk_size)):
+                        if skip:
+                            chunk, skip = chunk[skip:], max(skip - len(chunk), 0)
+                            if not chunk:
+                                continue
+                        offset += len(chunk)
+                        yield chunk
+                return
+            except _RETRIED_ERRORS as exc:
+                if attempt == self._retries:
+                    raise
+                logging.warning(f"Resuming download of {name} at byte {offset} after error: {exc}")
+
+    def _download_to_file(self, url, path):
+        if os.path.exists(path):
+            logging.debug(f"Skipping {path}, it has already been downloaded")
+            return
+
+        partial_path = path + ".part"
+        offset = os.path.getsize(partial_path) if os.path.exists(partial_path) else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+
+        with self._session.get(url, headers=headers, stream=True, timeout=self._timeout) as response:
+            if response.status_code == 416:
+                # the partial file is already complete
+                pass
+            else:
+                response.raise_for_status()
+                # the server may ignore the range request and send the whole file
+                mode = "ab" if response.status_code == 206 else "wb"
+                with open(partial_path, mode) as result_file:
+                    for chunk in _counted(response.iter_content(chunk_size=self._chunk_size)):
+                        result_file.write(chunk)
+
+        os.replace(partial_path, path)
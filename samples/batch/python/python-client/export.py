@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+
+"""
+Export transcription result files to columnar tables of phrases and words, stored as NumPy
+`.npz`, Parquet, or Arrow files.
+"""
+
+import argparse
+import array
+import logging
+import os
+import sys
+from result_parser import iter_phrases, iter_words, read_chunks, read_source
+
+try:
+    import numpy as np
+except ImportError:
+    print("""
+    Importing numpy failed. The export of transcription results requires numpy, which can be
+    installed with the command `pip install numpy`.
+    """)
+    sys.exit(1)
+
+try:
+    import pyarrow
+    import pyarrow.feather
+    import pyarrow.parquet
+except ImportError:
+    # only required for Parquet and Arrow files
+    pyarrow = None
+
+# column name -> array type code, or None for dictionary-encoded text columns
+PHRASE_COLUMNS = {
+    "recording": None, "phrase_index": "i", "channel": "h", "speaker": "h", "offset": "q", "duration": "q",
+    "confidence": "f", "status": None, "lexical": None, "display": None,
+}
+WORD_COLUMNS = {
+    "recording": None, "phrase_index": "i", "channel": "h", "speaker": "h", "offset": "q", "duration": "q",
+    "confidence": "f", "word": None,
+}
+
+
+class _DictionaryColumn:
+    """
+    Text column that stores each distinct value once. Rows hold the int32 code of their value,
+    or -1 for missing values.
+    """
+
+    def __init__(self):
+        self.codes = array.array("i")
+        self.values = []
+        self._index = {}
+
+    def append(self, value):
+        if value is None:
+            self.codes.append(-1)
+            return
+        code = self._index.get(value)
+        if code is None:
+            code = self._index[value] = len(self.values)
+            self.values.append(value)
+        self.codes.append(code)
+
+
+class ColumnarTable:
+    """
+    Table that is built row by row into typed columns. `columns` maps the column names to
+    `array` type codes, or to None for dictionary-encoded text columns. Missing numbers are
+    stored as -1 in integer columns and as NaN in floating point columns.
+    """
+
+    def __init__(self, columns):
+        self._columns = {name: _DictionaryColumn() if typecode is None else array.array(typecode)
+                         for name, typecode in columns.items()}
+        self._missing = [None if typecode is None else float("nan") if typecode in "fd" else -1
+                         for typecode in columns.values()]
+        self._rows = 0
+
+    def __len__(self):
+        return self._rows
+
+    def append(self, row):
+        """
+        Append `row`, a tuple with one value per column in the order of the columns.
+        """
+        for column, missing, value in zip(self._columns.values(), self._missing, row):
+            column.append(missing if value is None else value)
+        self._rows += 1
+
+    def to_numpy(self):
+        """
+        Return the columns as a dict of NumPy arrays. The numeric columns are converted without
+        copying. A dictionary-encoded column `name` is returned as its codes `name`, and its
+        distinct values as their concatenated UTF-8 bytes `name_dictionary` and the offsets
+        `name_dictionary_offsets` of each value in the bytes, followed by their total length.
+        Unlike a fixed-width string array, this takes no more space than the text itself.
+        """
+        arrays = {}
+        for name, column in self._columns.items():
+            if isinstance(column, _DictionaryColumn):
+                arrays[name] = np.frombuffer(column.codes, dtype=np.int32)
+                encoded = [value.encode("utf-8") for value in column.values]
+                offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+                np.cumsum([len(value) for value in encoded], out=offsets[1:])
+                arrays[f"{name}_dictionary"] = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+                arrays[f"{name}_dictionary_offsets"] = offsets
+            else:
+                arrays[name] = np.frombuffer(column, dtype=column.typecode)
+        return arrays
+
+    def to_arrow(self):
+        """
+        Return the columns as a `pyarrow.Table`, with dictionary-encoded text columns and nulls
+        for missing values.
+        """
+        if pyarrow is None:
+            raise RuntimeError("pyarrow is required for Arrow and Parquet files, install it with `pip install pyarrow`")
+
+        fields = {}
+        for name, column in self._columns.items():
+            if isinstance(column, _DictionaryColumn):
+                codes = np.frombuffer(column.codes, dtype=np.int32)
+                fields[name] = pyarrow.DictionaryArray.from_arrays(
+                    codes, pyarrow.array(column.values, type=pyarrow.string()), mask=codes < 0)
+            else:
+                values = np.frombuffer(column, dtype=column.typecode)
+                missing = np.isnan(values) if column.typecode in "fd" else values < 0
+                fields[name] = pyarrow.array(values, mask=missing)
+        return pyarrow.table(fields)
+
+    def save(self, path):
+        """
+        Write the table to `path`. The format is chosen by the file extension: `.npz` for a
+        compressed NumPy archive, `.parquet` for Parquet, and `.arrow` or `.feather` for Arrow.
+        """
+        extension = os.path.splitext(path)[1].lower()
+        if extension == ".npz":
+            np.savez_compressed(path, **self.to_numpy())
+        elif extension in (".parquet", ".arrow", ".feather"):
+            table = self.to_arrow()
+            if extension == ".parquet":
+                pyarrow.parquet.write_table(table, path)
+            else:
+                pyarrow.feather.write_feather(table, path)
+        else:
+            raise ValueError(f"unsupported file type {extension}, use .npz, .parquet, .arrow or .feather")
+
+
+def load_npz(path):
+    """
+    Return a dict of the columns in the `.npz` file at `path` with the dictionary-encoded text
+    columns decoded into object arrays of strings.
+    """
+    with np.load(path) as archive:
+        arrays = {name: archive[name] for name in archive.files}
+    for name in [name for name in arrays if f"{name}_dictionary_offsets" in arrays]:
+        data = arrays.pop(f"{name}_dictionary").tobytes()
+        offsets = arrays.pop(f"{name}_dictionary_offsets")
+        # the code -1 of missing values selects the appended empty string
+        dictionary = np.empty(len(offsets), dtype=object)
+        dictionary[:-1] = [data[start:end].decode("utf-8") for start, end in zip(offsets[:-1], offsets[1:])]
+        dictionary[-1] = ""
+        arrays[name] = dictionary[arrays[name]]
+    return arrays
+
+
+def result_files(paths):
+    """
+    Return a generator over the JSON files in `paths`, which are files or directories that
+    are searched recursively.
+    """
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for directory, _, names in os.walk(path):
+            for name in sorted(names):
+                if name.endswith(".json"):
+                    yield os.path.join(directory, name)
+
+
+def export_results(paths, phrases_path=None, words_path=None):
+    """
+    Convert the result files in `paths` into a table of phrases written to `phrases_path` and a
+    table of words written to `words_path`, and return the tuple `(phrases, words)` of the
+    number of exported rows. Tables without a path are not created.
+    """
+    phrases = ColumnarTable(PHRASE_COLUMNS)
+    words = ColumnarTable(WORD_COLUMNS)
+    for path in result_files(paths):
+        recording = read_source(path) or os.path.basename(path)
+        if phrases_path is not None:
+            for phrase in iter_phrases(read_chunks(path)):
+                phrases.append((recording, phrase.index, phrase.channel, phrase.speaker, phrase.offset,
+                                phrase.duration, phrase.confidence, phrase.status, phrase.lexical, phrase.display))
+        if words_path is not None:
+            for word in iter_words(read_chunks(path)):
+                words.append((recording, word.phrase_index, word.channel, word.speaker, word.offset, word.duration,
+                              word.confidence, word.word))
+
+    if phrases_path is not None:
+        phrases.save(phrases_path)
+        logging.info(f"Exported {len(phrases)} phrases to {phrases_path}")
+    if words_path is not None:
+        words.save(words_path)
+        logging.info(f"Exported {len(words)} words to {words_path}")
+    return len(phrases), len(words)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("results", nargs="+", help="result files or directories with result files")
+    parser.add_argument("--phrases", help="output file of the phrase table (.npz, .parquet, .arrow)")
+    parser.add_argument("--words", help="output file of the word table (.npz, .parquet, .arrow)")
+    args = parser.parse_args()
+    if args.phrases is None and args.words is None:
+        parser.error("at least one of --phrases and --words is required")
+
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO, format="%(asctime)s %(message)s")
+    export_results(args.results, args.phrases, args.words)
+
+
+if __name__ == "__main__":
+    main()
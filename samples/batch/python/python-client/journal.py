@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+SUBMITTING = "Submitting"
+DOWNLOADED = "Downloaded"
+
+
+def definition_key(api_client, transcription_definition):
+    """
+    Return a key that identifies the transcription definition `transcription_definition` by its
+    content, independent of its display name and description.
+    """
+    definition = api_client.sanitize_for_serialization(transcription_definition)
+    definition.pop("displayName", None)
+    definition.pop("description", None)
+    return hashlib.sha256(json.dumps(definition, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class JobJournal:
+    """
+    Durable, append-only journal of transcription jobs in an SQLite database at `path`.
+
+    Every state change of a job is appended as an event: `Submitting` before a transcription is
+    created, the status reported by the service once it has been created, and `Downloaded` once
+    its results have been downloaded. The latest event of each job is its current state, so that
+    a restarted client can resume polling and downloading without creating transcriptions again.
+    The cache keys under which the results of a job are to be stored are kept as well, so that the
+    results of resumed jobs are cached.
+    """
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS events ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL, definition TEXT, "
+            "transcription_id TEXT, status TEXT NOT NULL, time REAL NOT NULL)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS events_by_key ON events (key, seq)")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS expected_results (key TEXT NOT NULL, uri TEXT NOT NULL, result_key TEXT NOT NULL)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS expected_results_by_key ON expected_results (key)")
+
+        # current state of each job: key -> (transcription id, status)
+        self._jobs = {}
+        self._keys = {}
+        rows = self._connection.execute(
+            "SELECT key, transcription_id, status FROM events "
+            "WHERE seq IN (SELECT MAX(seq) FROM events GROUP BY key)")
+        for key, transcription_id, status in rows:
+            self._set_state(key, transcription_id, status)
+
+    def _set_state(self, key, transcription_id, status):
+        self._jobs[key] = (transcription_id, status)
+        if transcription_id is not None:
+            self._keys[transcription_id] = key
+
+    def _append(self, key, transcription_id, status, definition=None):
+        with self._lock:
+            self._connection.execute(
+                "INSERT INTO events (key, definition, transcription_id, status, time) VALUES (?, ?, ?, ?, ?)",
+                (key, definition, transcription_id, status, time.time()))
+            self._set_state(key, transcription_id, status)
+
+    def close(self):
+        self._connection.close()
+
+    def state(self, key):
+        """
+        Return the tuple `(transcription_id, status)` of the job `key`, or None if the job is not
+        in the journal.
+        """
+        return self._jobs.get(key)
+
+    def key(self, transcription_id):
+        """
+        Return the key of the job of the transcription `transcription_id`.
+        """
+        return self._keys[transcription_id]
+
+    def jobs(self, status):
+        """
+        Return a list of tuples `(key, transcription_id)` of all jobs with the status `status`.
+        """
+        return [(key, transcription_id) for key, (transcription_id, job_status) in self._jobs.items()
+                if job_status == status]
+
+    def record_submitting(self, key, definition):
+        """
+        Record that the transcription for the job `key` with the serialized definition
+        `definition` is about to be created.
+        """
+        self._append(key, None, SUBMITTING, json.dumps(definition))
+
+    def record_expected(self, key, expected):
+        """
+        Record the list of tuples `(uri, result key)` of the recordings of the job `key` whose
+        results are to be stored in the result cache, replacing those of an earlier submission.
+        """
+        with self._lock:
+            self._connection.execute("BEGIN")
+            self._connection.execute("DELETE FROM expected_results WHERE key = ?", (key,))
+            self._connection.executemany("INSERT INTO expected_results (key, uri, result_key) VALUES (?, ?, ?)",
+                                         [(key, uri, result_key) for uri, result_key in expected])
+            self._connection.execute("COMMIT")
+
+    def expected(self, key):
+        """
+        Return the list of tuples `(uri, result key)` recorded for the job `key` with `record_expected`.
+        """
+        with self._lock:
+            return self._connection.execute(
+                "SELECT uri, result_key FROM expected_results WHERE key = ?", (key,)).fetchall()
+
+    def record_status(self, key, transcription_id, status):
+        """
+        Record the status of the transcription `transcription_id` of the job `key`.
+        """
+        self._append(key, transcription_id, status)
+
+    def record_downloaded(self, transcription_id):
+        """
+        Record that the results of the transcription `transcription_id` have been downloaded.
+        """
+        self._append(self.key(transcription_id), transcription_id, DOWNLOADED)
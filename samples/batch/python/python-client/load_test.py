@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+
+"""
+Load test of the batch client against the local mock server. Creates transcriptions
+concurrently, polls them until completion, downloads their results, and deletes all
+transcriptions, then reports requests per second, latency percentiles, and completion time of
+each phase.
+"""
+
+import argparse
+import functools
+import logging
+import threading
+import time
+import swagger_client as cris_client
+
+import main
+from download import ResultDownloader
+from mock_server import MockSpeechService, start_mock_server
+from poller import TranscriptionPoller
+
+
+class RequestTimer:
+    """
+    Records the latency of all requests sent by a generated `ApiClient`.
+    """
+
+    def __init__(self, api_client):
+        self.latencies = []
+        self._lock = threading.Lock()
+
+        rest_client = api_client.rest_client
+        request = rest_client.request
+
+        @functools.wraps(request)
+        def timed_request(*args, **kwargs):
+            start = time.monotonic()
+            try:
+                return request(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.latencies.append(time.monotonic() - start)
+
+        # the GET, POST, ... methods of the REST client all call `request`
+        rest_client.request = timed_request
+
+    def take(self):
+        """
+        Return the latencies recorded since the last call and reset them.
+        """
+        with self._lock:
+            latencies, self.latencies = self.latencies, []
+        return latencies
+
+
+def _percentile(values, percent):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def _report(phase, latencies, elapsed):
+    print(f"{phase:<10} {len(latencies):>8} requests in {elapsed:8.2f}s: {len(latencies) / elapsed:8.1f} requests/s, "
+          f"p50 {_percentile(latencies, 50) * 1000:7.1f}ms, p99 {_percentile(latencies, 99) * 1000:7.1f}ms")
+
+
+def run(args):
+    service = MockSpeechService(latency=args.latency, failure_rate=args.failure_rate, page_size=args.page_size,
+                                job_duration=args.job_duration, phrases_per_file=args.phrases_per_file)
+    server = start_mock_server(service)
+
+    configuration = cris_client.Configuration()
+    configuration.api_key["Ocp-Apim-Subscription-Key"] = "load-test"
+    configuration.host = server.base_url
+    configuration.connection_pool_maxsize = args.concurrency
+    api = cris_client.DefaultApi(api_client=cris_client.ApiClient(configuration))
+    timer = RequestTimer(api.api_client)
+
+    uris = (f"https://example.com/recordings/{i}.wav" for i in range(args.recordings))
+    transcription_definitions = (main.transcribe_from_blobs(chunk, {})
+                                 for chunk in main._chunks(uris, args.recordings_per_transcription))
+
+    start = time.monotonic()
+    created = [transcription_id for _, transcription_id in
+               main.submit_transcriptions(api, transcription_definitions, max_workers=args.concurrency)
+               if transcription_id is not None]
+    _report("create", timer.take(), time.monotonic() - start)
+
+    completed = []
+    poll_start = time.monotonic()
+    poller = TranscriptionPoller(api, on_completed=lambda transcription_id, transcription: completed.append(transcription_id),
+                                 initial_interval=args.poll_interval, max_interval=4 * args.poll_interval)
+    for transcription_id in created:
+        poller.add(transcription_id)
+    poller.run()
+    _report("poll", timer.take(), time.monotonic() - poll_start)
+
+    download_start = time.monotonic()
+    downloaded_bytes = 0
+    lock = threading.Lock()
+
+    def count_bytes(name, chunks):
+        nonlocal downloaded_bytes
+        size = sum(len(chunk) for chunk in chunks)
+        with lock:
+            downloaded_bytes += size
+
+    result_files = (file_data
+                    for transcription_id in completed
+                    for file_data in main._paginate(api, api.get_transcription_files(transcription_id))
+                    if file_data.kind == "Transcription")
+    ResultDownloader(max_workers=args.concurrency).download(result_files, sink=count_bytes)
+    _report("download", timer.take(), time.monotonic() - download_start)
+    print(f"{'':<10} {downloaded_bytes / 1e6:.1f} MB of results")
+
+    delete_start = time.monotonic()
+    main.MAX_CONCURRENT_DELETIONS = args.concurrency
+    main.MAX_DELETIONS_PER_SECOND = None
+    main.delete_all_transcriptions(api, selector=lambda transcription: True)
+    _report("delete", timer.take(), time.monotonic() - delete_start)
+
+    print(f"{len(created)} transcriptions of {args.recordings} recordings completed in {time.monotonic() - start:.2f}s, "
+          f"{service.requests} requests served by the mock server")
+    server.shutdown()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--recordings", type=int, default=10000, help="number of recordings")
+    parser.add_argument("--recordings-per-transcription", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=16, help="number of concurrent requests")
+    parser.add_argument("--latency", type=float, default=0.02, help="latency of the mock server in seconds")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="probability that a request fails")
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--job-duration", type=float, default=2.0, help="duration of a transcription in seconds")
+    parser.add_argument("--phrases-per-file", type=int, default=10)
+    parser.add_argument("--poll-interval", type=float, default=0.5, help="initial status polling interval in seconds")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    # the batch client logs every request at debug level
+    logging.getLogger().setLevel(logging.WARNING)
+    run(arguments)
@@ -4,11 +4,29 @@
 # Copyright (c) Microsoft. All rights reserved.
 # Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
 
+import collections
+import concurrent.futures
+import contextlib
+import functools
+import itertools
 import logging
+import os
+import queue
+import re
 import sys
+import threading
+import urllib.parse
 import requests
-import time
 import swagger_client as cris_client
+import urllib3
+
+from cleanup import bulk_delete
+from download import ResultDownloader
+from poller import TranscriptionPoller
+from retry import RetryBudget, RetryPolicy, install_retries
+
+# The modules that are only used to transcribe a manifest are imported by the functions that use
+# them, so that transcribe() does not depend on them.
 
 logging.basicConfig(stream=sys.stdout, level=logging.DEBUG,
         format="%(asctime)s %(message)s", datefmt="%m/%d/%Y %I:%M:%S %p %Z")
@@ -17,6 +35,17 @@ logging.basicConfig(stream=sys.stdout, level=logging.DEBUG,
 SUBSCRIPTION_KEY = "YourSubscriptionKey"
 SERVICE_REGION = "YourServiceRegion"
 
+# Additional speech resources as tuples (region, subscription key, maximum concurrent requests),
+# optionally followed by a name of the resource that is used in transcription ids. If set, the
+# transcriptions of a manifest are distributed over these resources and the one above, to scale
+# beyond the limits of a single resource. Raise MAX_CONCURRENT_SUBMISSIONS to the total number of
+# concurrent requests of all resources. Resources without a name are named after their region,
+# with a number appended if there are several resources in a region.
+SERVICE_RESOURCES = [
+    # ("YourOtherServiceRegion", "YourOtherSubscriptionKey", 8),
+    # ("YourServiceRegion", "YourSecondSubscriptionKey", 8, "second"),
+]
+
 NAME = "Simple transcription"
 DESCRIPTION = "Simple transcription description"
 
@@ -26,6 +55,85 @@ RECORDINGS_BLOB_URI = "<Your SAS Uri to the recording>"
 # Provide the uri of a container with audio files for transcribing all of them with a single request
 RECORDINGS_CONTAINER_URI = "<Your SAS Uri to a container of audio files>"
 
+# Provide the path of a manifest file with one SAS Uri per line for transcribing many recordings
+RECORDINGS_MANIFEST = "<Path to a manifest file with SAS Uris of recordings>"
+
+# Local directory with copies of the recordings of the manifest, e.g. the directory from which they
+# were uploaded. If set, these files are checked for corrupt headers, unsupported formats, and
+# silence before transcribing, and recordings with the same file name that fail the check are
+# not transcribed.
+PREFLIGHT_DIRECTORY = None
+
+# Number of recordings that are grouped into one transcription when transcribing from a manifest
+RECORDINGS_PER_TRANSCRIPTION = 100
+
+# Target total duration in seconds of the recordings in one transcription when transcribing from a
+# manifest. If set, the recordings are packed into transcriptions by their duration, so that the
+# transcriptions take about the same time, otherwise they are grouped by count.
+TARGET_TRANSCRIPTION_DURATION = None  # e.g. 4 * 60 * 60
+
+# Maximum number of transcriptions that are created concurrently. Keep this below the request
+# limits of your speech resource.
+MAX_CONCURRENT_SUBMISSIONS = 8
+
+# Number of concurrent delete requests and maximum number of delete requests per second when
+# deleting transcriptions
+MAX_CONCURRENT_DELETIONS = 8
+MAX_DELETIONS_PER_SECOND = 20
+
+# Maximum number of attempts of a request that fails with a transient error, such as throttling
+# (429) or an unavailable service (5xx), and the ratio of retries to requests above which failed
+# requests are not retried anymore
+MAX_REQUEST_ATTEMPTS = 5
+RETRY_BUDGET_RATIO = 0.2
+
+# Number of connections per host that are kept alive and shared by the API client and the HTTP
+# requests for recordings and results. Keep this at least as large as the number of concurrent
+# requests, otherwise connections are closed after use and new TLS handshakes are needed.
+CONNECTION_POOL_SIZE = 16
+
+# Number of seconds for which host name lookups are cached, or None to look up the host name for
+# every new connection
+DNS_CACHE_TTL = 300
+
+# Send the requests of the API client over HTTP/2 with a single multiplexed connection. Requires
+# `pip install httpx[http2]`.
+USE_HTTP2 = False
+
+# Public url at which the service can reach this client, e.g. through a reverse proxy or a tunnel,
+# to notify it when a transcription has completed. If set, a web hook is registered for the
+# duration of the run and notifications are received on WEBHOOK_PORT, so that the status of the
+# transcriptions is only polled every FALLBACK_POLL_INTERVAL seconds in case a notification is lost.
+WEBHOOK_URL = None  # e.g. "https://example.com/speech-notifications"
+WEBHOOK_PORT = 8080
+# Secret with which the service signs the notifications
+WEBHOOK_SECRET = "<Your web hook secret>"
+FALLBACK_POLL_INTERVAL = 300
+
+# Port on which metrics of the client, such as the number of transcriptions by status, the time
+# spent in each status, and the latency of requests, are served at /metrics in the OpenMetrics
+# format for Prometheus, or None to not serve them
+METRICS_PORT = None  # e.g. 9090
+
+# Number of pages of paginated lists that are requested ahead of the consumer
+PAGES_TO_PREFETCH = 2
+
+# Directory to which the transcription results are downloaded
+RESULTS_DIRECTORY = "results"
+
+# Path of the journal that records the state of all transcription jobs of a manifest, so that an
+# interrupted client resumes its jobs instead of creating the transcriptions again
+JOURNAL_PATH = "transcriptions.sqlite3"
+
+# Submit the definitions again whose transcriptions failed in an earlier run of the manifest.
+# Otherwise every definition that is in the journal is skipped.
+RESUBMIT_FAILED = False
+
+# Directory and maximum size in bytes of the cache of transcription results. Recordings whose
+# results are cached are not transcribed again when transcribing from a manifest.
+RESULT_CACHE_DIRECTORY = "result-cache"
+RESULT_CACHE_MAX_BYTES = 1 << 30
+
 # Set model information when doing transcription with custom models
 MODEL_REFERENCE = None  # guid of a custom model
 
@@ -86,58 +194,522 @@ def transcribe_from_container(uri, properties):
     return transcription_definition
 
 
-def _paginate(api, paginated_object):
+def transcribe_from_blobs(uris, properties):
     """
-    The autogenerated client does not support pagination. This function returns a generator over
-    all items of the array that the paginated object `paginated_object` is part of.
+    Transcribe all audio files located at `uris` with a single transcription using the settings
+    specified in `properties` using the base model for the specified locale.
+    """
+    transcription_definition = cris_client.Transcription(
+        display_name=NAME,
+        description=DESCRIPTION,
+        locale=LOCALE,
+        content_urls=list(uris),
+        properties=properties
+    )
+
+    return transcription_definition
+
+
+def read_manifest(path):
+    """
+    Returns a generator over the SAS URIs listed in the manifest file at `path`. The manifest
+    contains one URI per line, empty lines and lines starting with '#' are ignored.
+    """
+    with open(path, encoding="utf-8") as manifest:
+        for line in manifest:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield line
+
+
+def _skip_rejected(uris, directory):
+    """
+    Check the local recordings in `directory` with `preflight`, and return a generator over the
+    URIs in `uris` whose file name is not that of a rejected recording.
+    """
+    from preflight import list_recordings, preflight
+
+    rejected = set()
+    for result in preflight(list_recordings(directory)):
+        if not result.ok:
+            logging.warning(f"Skipping recording {os.path.basename(result.path)}: {'; '.join(result.errors)}")
+            rejected.add(os.path.basename(result.path))
+        elif result.warnings:
+            logging.info(f"Recording {os.path.basename(result.path)}: {'; '.join(result.warnings)}")
+    logging.info(f"Preflight check rejected {len(rejected)} recordings in {directory}")
+
+    for uri in uris:
+        if os.path.basename(urllib.parse.unquote(urllib.parse.urlsplit(uri).path)) not in rejected:
+            yield uri
+
+
+def _chunks(iterable, size):
+    """
+    Returns a generator over lists of at most `size` consecutive items of `iterable`.
+    """
+    iterator = iter(iterable)
+    chunk = list(itertools.islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(itertools.islice(iterator, size))
+
+
+def create_transcription(api, transcription_definition):
     """
-    yield from paginated_object.values
+    Create a transcription from `transcription_definition` and return the id of the new
+    transcription.
+    """
+    created_transcription, status, headers = api.create_transcription_with_http_info(transcription=transcription_definition)
+
+    # get the transcription Id from the location URI
+    return headers["location"].split("/")[-1]
+
+
+def submit_transcriptions(api, transcription_definitions, max_workers=MAX_CONCURRENT_SUBMISSIONS):
+    """
+    Create a transcription for each definition in `transcription_definitions` using a pool of
+    `max_workers` threads. Definitions are consumed lazily, so that at most `max_workers` requests
+    are in flight and only a bounded number of definitions is held in memory.
+
+    Returns a generator over tuples `(transcription_definition, transcription_id)` in completion
+    order. `transcription_id` is None if the transcription could not be created.
+    """
+    definitions = iter(transcription_definitions)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {}
+
+        def fill():
+            for transcription_definition in itertools.islice(definitions, max_workers - len(pending)):
+                future = executor.submit(create_transcription, api, transcription_definition)
+                pending[future] = transcription_definition
+
+        fill()
+        while pending:
+            done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                transcription_definition = pending.pop(future)
+                try:
+                    transcription_id = future.result()
+                except (cris_client.rest.ApiException, urllib3.exceptions.HTTPError) as exc:
+                    # creating a transcription is not retried, so a connection error only fails
+                    # this definition
+                    logging.error(f"Could not create transcription: {exc}")
+                    transcription_id = None
+                yield transcription_definition, transcription_id
+
+            # keep the pipeline full
+            fill()
+
+
+def _get_next_page(api, paginated_object):
+    """
+    Return the page following `paginated_object`, or None if it is the last page.
+    """
+    if not paginated_object.next_link:
+        return None
+
     typename = type(paginated_object).__name__
     auth_settings = ["apiKeyHeader", "apiKeyQuery"]
-    while paginated_object.next_link:
-        link = paginated_object.next_link[len(api.api_client.configuration.host):]
-        paginated_object, status, headers = api.api_client.call_api(link, "GET",
-            response_type=typename, auth_settings=auth_settings)
+    link = paginated_object.next_link[len(api.api_client.configuration.host):]
+    paginated_object, status, headers = api.api_client.call_api(link, "GET",
+        response_type=typename, auth_settings=auth_settings)
 
-        if status == 200:
-            yield from paginated_object.values
-        else:
-            raise Exception(f"could not receive paginated data: status {status}")
+    if status != 200:
+        raise Exception(f"could not receive paginated data: status {status}")
+    return paginated_object
 
 
-def delete_all_transcriptions(api):
-    """
-    Delete all transcriptions associated with your speech resource.
+_END_OF_PAGES = object()
+
+
+def _paginate(api, paginated_object, prefetch=PAGES_TO_PREFETCH):
     """
-    logging.info("Deleting all existing completed transcriptions.")
+    The autogenerated client does not support pagination. This function returns a generator over
+    all items of the array that the paginated object `paginated_object` is part of.
 
-    # get all transcriptions for the subscription
-    transcriptions = list(_paginate(api, api.get_transcriptions()))
+    Up to `prefetch` pages are requested in a background thread while the items of the current
+    page are consumed.
+    """
+    pages = queue.Queue(maxsize=prefetch)
+    stopped = threading.Event()
+
+    def fetch_pages():
+        page = paginated_object
+        while not stopped.is_set():
+            try:
+                page = _get_next_page(api, page)
+            except Exception as exc:
+                page = exc
+            item = _END_OF_PAGES if page is None else page
+            # give up waiting for free space if the consumer has stopped iterating
+            while not stopped.is_set():
+                try:
+                    pages.put(item, timeout=0.5)
+                    break
+                except queue.Full:
+                    pass
+            if page is None or isinstance(page, Exception):
+                return
+
+    fetcher = threading.Thread(target=fetch_pages, daemon=True)
+    fetcher.start()
+    try:
+        yield from paginated_object.values
+        while True:
+            page = pages.get()
+            if page is _END_OF_PAGES:
+                return
+            if isinstance(page, Exception):
+                raise page
+            yield from page.values
+    finally:
+        stopped.set()
+
+
+def delete_all_transcriptions(api, selector=None, dry_run=False):
+    """
+    Delete all transcriptions associated with your speech resource that are selected by
+    `selector`, by default all completed transcriptions. `selector` is a callable such as a
+    `TranscriptionFilter`, or a `RetentionPolicy`. With `dry_run`, the transcriptions that would
+    be deleted are only counted.
+    """
+    if dry_run:
+        logging.info("Counting the existing transcriptions that would be deleted.")
+    else:
+        logging.info("Deleting all existing completed transcriptions.")
 
-    # Delete all pre-existing completed transcriptions.
+    # Stream all transcriptions for the subscription into a pool of deletion workers.
     # If transcriptions are still running or not started, they will not be deleted.
-    for transcription in transcriptions:
-        transcription_id = transcription._self.split('/')[-1]
-        logging.debug(f"Deleting transcription with id {transcription_id}")
-        try:
-            api.delete_transcription(transcription_id)
-        except cris_client.rest.ApiException as exc:
-            logging.error(f"Could not delete transcription {transcription_id}: {exc}")
+    return bulk_delete(api, _paginate(api, api.get_transcriptions()), selector=selector,
+                       max_workers=MAX_CONCURRENT_DELETIONS, rate=MAX_DELETIONS_PER_SECOND, dry_run=dry_run)
 
 
-def transcribe():
-    logging.info("Starting transcription client...")
+def _create_session():
+    """
+    Create the `requests.Session` for recordings and results, whose connection pool is shared with
+    the API client created by `_create_api`.
+    """
+    from transport import DnsCache, create_pool_manager, share_pool_manager
+
+    dns_cache = DnsCache(DNS_CACHE_TTL) if DNS_CACHE_TTL else None
+    session = requests.Session()
+    share_pool_manager(create_pool_manager(CONNECTION_POOL_SIZE, dns_cache=dns_cache), session=session)
+    return session
+
 
+def _create_api(session=None, region=SERVICE_REGION, subscription_key=SUBSCRIPTION_KEY):
+    """
+    Create an instance of the transcription api class for your speech resource. The API client
+    sends its requests over the connection pool of `session`, if given.
+    """
     # configure API key authorization: subscription_key
     configuration = cris_client.Configuration()
-    configuration.api_key["Ocp-Apim-Subscription-Key"] = SUBSCRIPTION_KEY
-    configuration.host = f"https://{SERVICE_REGION}.api.cognitive.microsoft.com/speechtotext/v3.0"
+    configuration.api_key["Ocp-Apim-Subscription-Key"] = subscription_key
+    configuration.host = f"https://{region}.api.cognitive.microsoft.com/speechtotext/v3.0"
+    configuration.connection_pool_maxsize = CONNECTION_POOL_SIZE
 
     # create the client object and authenticate
     client = cris_client.ApiClient(configuration)
+    if USE_HTTP2:
+        from transport import Http2RestClient
+        client.rest_client = Http2RestClient(configuration, max_connections=CONNECTION_POOL_SIZE)
+    elif session is not None:
+        from transport import share_pool_manager
+        share_pool_manager(session.get_adapter("https://").poolmanager, api_client=client)
+
+    # retry transient failures with exponential backoff, with a circuit breaker for the service
+    install_retries(client, RetryPolicy(max_attempts=MAX_REQUEST_ATTEMPTS), RetryBudget(ratio=RETRY_BUDGET_RATIO))
 
     # create an instance of the transcription api class
-    api = cris_client.DefaultApi(api_client=client)
+    return cris_client.DefaultApi(api_client=client)
+
+
+def _create_multi_region_api(session=None):
+    """
+    Create an api that distributes the transcriptions over your speech resource and the resources
+    in `SERVICE_RESOURCES`.
+    """
+    from regions import MultiRegionApi, RegionResource, RegionScheduler
+
+    settings = [(SERVICE_REGION, SUBSCRIPTION_KEY, MAX_CONCURRENT_SUBMISSIONS)] + list(SERVICE_RESOURCES)
+    regions = collections.Counter(setting[0] for setting in settings if len(setting) < 4)
+    numbers = collections.Counter()
+    resources = []
+    for region, key, max_concurrent, *name in settings:
+        if not name and regions[region] > 1:
+            # several keys in one region, e.g. to go beyond the quota of one resource
+            numbers[region] += 1
+            name = [f"{region}-{numbers[region]}"]
+        resources.append(RegionResource(region, key, max_concurrent, *name))
+    scheduler = RegionScheduler(
+        resources, lambda resource: _create_api(session, resource.region, resource.subscription_key))
+    return MultiRegionApi(scheduler)
+
+
+def _download_results(api, downloader, cache, transcription_id):
+    """
+    Download the transcription results of all files of the succeeded transcription
+    `transcription_id` to a subdirectory of `RESULTS_DIRECTORY` and add them to the result
+    `cache`, if given. Returns whether all files have been downloaded.
+    """
+    pag_files = api.get_transcription_files(transcription_id)
+    result_files = (file_data for file_data in _paginate(api, pag_files) if file_data.kind == "Transcription")
+
+    directory = os.path.join(RESULTS_DIRECTORY, transcription_id)
+    downloaded, failed = downloader.download(result_files, directory=directory)
+    logging.info(f"Downloaded {len(downloaded)} result files of transcription {transcription_id} to {directory}")
+    if failed:
+        logging.error(f"Could not download {len(failed)} result files of transcription {transcription_id}, "
+                      "run the client again to resume")
+    if cache is not None:
+        cache.store_results(directory)
+    return not failed
+
+
+def _handle_completed(api, downloader, cache, journal, transcription_id, transcription):
+    """
+    Record the completed transcription `transcription` in the `journal`, if given, and download
+    its results.
+    """
+    if journal is not None:
+        journal.record_status(journal.key(transcription_id), transcription_id, transcription.status)
+    if transcription.status == "Succeeded":
+        if _download_results(api, downloader, cache, transcription_id) and journal is not None:
+            journal.record_downloaded(transcription_id)
+    elif transcription.status == "Failed":
+        logging.info(f"Transcription {transcription_id} failed: {transcription.properties.error.message}")
+
+
+_JOURNAL_MARKER = re.compile(r"\[journal:([0-9a-f]+)\]")
+
+
+def _journal_marker(key):
+    return f"[journal:{key}]"
+
+
+def _journal_key(description):
+    # the key of the job in the journal marker of a description, or None
+    match = _JOURNAL_MARKER.search(description or "")
+    return match.group(1) if match else None
+
+
+def _recover_submitting(api, journal):
+    """
+    Find the transcriptions of jobs that were being created when the client was interrupted. The
+    transcriptions are identified by the journal marker in their description. Jobs without a
+    transcription remain in the state `Submitting` and are submitted again.
+    """
+    from journal import SUBMITTING
+
+    submitting = {key for key, _ in journal.jobs(SUBMITTING)}
+    if not submitting:
+        return
+
+    logging.info(f"Looking up {len(submitting)} transcriptions that were being created when the client stopped.")
+    found = {}
+    for transcription in _paginate(api, api.get_transcriptions()):
+        key = _journal_key(transcription.description)
+        # a failed transcription of a definition that was submitted again has the same marker
+        if key in submitting and (key not in found or found[key].status == "Failed"):
+            found[key] = transcription
+    for key, transcription in found.items():
+        journal.record_status(key, transcription._self.split("/")[-1], transcription.status)
+
+
+def _drop_cached(cache, transcription_definition, executor, session):
+    """
+    Remove the recordings from `transcription_definition` whose transcription results are in the
+    result `cache`, and copy their results to the subdirectory `cached` of `RESULTS_DIRECTORY`.
+    The blobs are looked up in parallel with `executor`. Returns a list of tuples `(uri, key)`
+    of the cache keys under which the results of the remaining recordings are to be stored.
+    """
+    from result_cache import blob_content_id, result_key
+
+    directory = os.path.join(RESULTS_DIRECTORY, "cached")
+    os.makedirs(directory, exist_ok=True)
+
+    def content_id(uri):
+        try:
+            return blob_content_id(uri, session)
+        except requests.RequestException as exc:
+            logging.warning(f"Could not look up recording, it is not cached: {exc}")
+            return None
+
+    uris = transcription_definition.content_urls
+    remaining = []
+    expected = []
+    for uri, blob_id in zip(uris, executor.map(content_id, uris)):
+        if blob_id is None:
+            remaining.append(uri)
+            continue
+
+        key = result_key(blob_id, transcription_definition.locale, transcription_definition.model,
+                         transcription_definition.properties)
+        if cache.get(key, os.path.join(directory, f"{key}.json")):
+            logging.info(f"Using cached result {key}.json for recording {uri.split('?')[0]}")
+            continue
+
+        remaining.append(uri)
+        expected.append((uri, key))
+
+    transcription_definition.content_urls = remaining
+    return expected
+
+
+@contextlib.contextmanager
+def _notifications(api, poller):
+    """
+    Register a web hook at `WEBHOOK_URL` for the duration of the block, and poll the status of a
+    transcription as soon as the service notifies that it has completed.
+    """
+    from webhooks import WebhookReceiver, register_hook
+
+    receiver = WebhookReceiver(lambda event, transcription_id: poller.notify(transcription_id), WEBHOOK_SECRET,
+                               port=WEBHOOK_PORT).start()
+    try:
+        hook_id = register_hook(api, WEBHOOK_URL, WEBHOOK_SECRET)
+        logging.info(f"Registered web hook with id '{hook_id}' for {WEBHOOK_URL}")
+        try:
+            yield
+        finally:
+            api.delete_hook(hook_id)
+    finally:
+        receiver.shutdown()
+        logging.info(f"Web hook statistics: {dict(receiver.stats)}")
+
+
+def _run_transcriptions(api, transcription_definitions, cache=None, session=None, journal_path=None):
+    """
+    Create a transcription for each definition in `transcription_definitions`, wait for them to
+    complete, and download their results with `session` to `RESULTS_DIRECTORY` and the result
+    `cache`, if given. If `WEBHOOK_URL` is set, the transcriptions are polled when the service
+    notifies that they have completed instead of in short intervals.
+    If `journal_path` is given, all jobs are recorded in the journal at that path:
+    transcriptions that were created by a previous run are not created again, but polled and
+    downloaded if they have not completed yet.
+    """
+    from journal import JobJournal
+    from regions import MultiRegionApi
+
+    journal = JobJournal(journal_path) if journal_path is not None else None
+    downloader = ResultDownloader(session)
+    on_completed = functools.partial(_handle_completed, api, downloader, cache, journal)
+    # the web hooks of several resources would notify about transcriptions without their qualified id
+    use_webhook = WEBHOOK_URL is not None and not isinstance(api, MultiRegionApi)
+    if use_webhook:
+        poller = TranscriptionPoller(api, on_completed, initial_interval=FALLBACK_POLL_INTERVAL,
+                                     max_interval=FALLBACK_POLL_INTERVAL)
+    else:
+        poller = TranscriptionPoller(api, on_completed)
+
+    with _notifications(api, poller) if use_webhook else contextlib.nullcontext():
+        _submit_and_poll(api, transcription_definitions, cache, journal, downloader, poller, session)
+    if journal is not None:
+        journal.close()
+
+    retry_stats = getattr(api.api_client.rest_client, "stats", None)
+    if retry_stats is not None:
+        logging.info(f"Request statistics: {dict(retry_stats)}")
+
+
+def _resume_jobs(api, journal, cache, downloader, poller):
+    """
+    Resume polling and downloading the transcriptions of a previous run that are in the `journal`,
+    and store their results in the result `cache`, if given.
+    """
+    _recover_submitting(api, journal)
+    for status in ("NotStarted", "Running", "Succeeded"):
+        for key, _ in journal.jobs(status):
+            for uri, result_key in journal.expected(key) if cache is not None else ():
+                cache.expect(uri, result_key)
+
+    for status in ("NotStarted", "Running"):
+        for _, transcription_id in journal.jobs(status):
+            logging.info(f"Resuming transcription with id '{transcription_id}'")
+            poller.add(transcription_id)
+    for _, transcription_id in journal.jobs("Succeeded"):
+        logging.info(f"Resuming download of transcription with id '{transcription_id}'")
+        if _download_results(api, downloader, cache, transcription_id):
+            journal.record_downloaded(transcription_id)
+
+
+def _submit_and_poll(api, transcription_definitions, cache, journal, downloader, poller, session=None):
+    from journal import SUBMITTING, definition_key
+    from metrics import TRANSCRIPTIONS_SUBMITTED
+    from regions import RESOURCE_SEPARATOR
+
+    if journal is not None:
+        _resume_jobs(api, journal, cache, downloader, poller)
+
+    def new_definitions(lookups):
+        for transcription_definition in transcription_definitions:
+            # the journal key is computed from the definition with all its recordings, so that it
+            # does not change when more results are cached
+            key = definition_key(api.api_client, transcription_definition) if journal is not None else None
+            state = journal.state(key) if journal is not None else None
+            if state is not None and state[1] == "Failed" and RESUBMIT_FAILED:
+                logging.info(f"Submitting definition again, its transcription {state[0]} has failed")
+            elif state is not None and state[1] != SUBMITTING:
+                logging.info(f"Skipping definition, it has been submitted as transcription {state[0]} before "
+                             f"and is {state[1]}")
+                continue
+
+            expected = _drop_cached(cache, transcription_definition, lookups, session) if cache is not None else []
+            if not transcription_definition.content_urls and transcription_definition.content_container_url is None:
+                logging.info("Skipping definition, the results of all its recordings are cached")
+                continue
+
+            if journal is not None:
+                marker = _journal_marker(key)
+                transcription_definition.description = f"{transcription_definition.description or ''} {marker}".strip()
+                journal.record_submitting(key, api.api_client.sanitize_for_serialization(transcription_definition))
+                journal.record_expected(key, [(uri.split("?")[0], result_key) for uri, result_key in expected])
+            for uri, result_key in expected:
+                cache.expect(uri, result_key)
+            yield transcription_definition
+
+    # poll the status of the created transcriptions while submitting the remaining ones
+    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_CONCURRENT_SUBMISSIONS) as lookups:
+        for transcription_definition, transcription_id in submit_transcriptions(api, new_definitions(lookups)):
+            if transcription_id is not None:
+                # Log information about the created transcription. If you should ask for support, please
+                # include this information. Qualified ids `<id>@<resource name>` name the resource.
+                _, qualified, resource_name = transcription_id.rpartition(RESOURCE_SEPARATOR)
+                location = f"resource {resource_name}" if qualified else f"region {SERVICE_REGION}"
+                logging.info(f"Created new transcription with id '{transcription_id}' in {location} "
+                             f"for {len(transcription_definition.content_urls or [])} recordings")
+                if journal is not None:
+                    journal.record_status(_journal_key(transcription_definition.description), transcription_id,
+                                          "NotStarted")
+                TRANSCRIPTIONS_SUBMITTED.inc()
+                poller.add(transcription_id)
+
+            poller.poll_due()
+
+    logging.info(f"Checking status of {len(poller)} running transcriptions.")
+    poller.run()
+    logging.info(f"All transcriptions completed after {poller.requests} status requests.")
+
+
+def _log_results(api, transcription_id, transcription):
+    if transcription.status == "Succeeded":
+        pag_files = api.get_transcription_files(transcription_id)
+        for file_data in _paginate(api, pag_files):
+            if file_data.kind != "Transcription":
+                continue
+
+            audiofilename = file_data.name
+            results_url = file_data.links.content_url
+            results = requests.get(results_url)
+            logging.info(f"Results for {audiofilename}:\n{results.content.decode('utf-8')}")
+    elif transcription.status == "Failed":
+        logging.info(f"Transcription failed: {transcription.properties.error.message}")
+
+
+def transcribe():
+    logging.info("Starting transcription client...")
+
+    api = _create_api()
 
     # Specify transcription properties by passing a dict to the properties parameter. See
     # https://docs.microsoft.com/azure/cognitive-services/speech-service/batch-transcription#configuration-properties
@@ -160,10 +732,7 @@ def transcribe():
     # Uncomment this block to transcribe all files from a container.
     # transcription_definition = transcribe_from_container(RECORDINGS_CONTAINER_URI, properties)
 
-    created_transcription, status, headers = api.create_transcription_with_http_info(transcription=transcription_definition)
-
-    # get the transcription Id from the location URI
-    transcription_id = headers["location"].split("/")[-1]
+    transcription_id = create_transcription(api, transcription_definition)
 
     # Log information about the created transcription. If you should ask for support, please
     # include this information.
@@ -171,32 +740,55 @@ def transcribe():
 
     logging.info("Checking status.")
 
-    completed = False
+    poller = TranscriptionPoller(api, functools.partial(_log_results, api))
+    poller.add(transcription_id)
+    poller.run()
+
+
+def transcribe_manifest():
+    """
+    Transcribe all recordings listed in the manifest file `RECORDINGS_MANIFEST`. The recordings are
+    grouped into transcriptions of at most `RECORDINGS_PER_TRANSCRIPTION` files each, packed by
+    duration if `TARGET_TRANSCRIPTION_DURATION` is set, which are created concurrently.
+    """
+    from metrics import start_metrics_server
+    from planner import pack_by_duration, recording_durations
+    from result_cache import ResultCache
+
+    logging.info("Starting transcription client...")
+    if METRICS_PORT is not None:
+        start_metrics_server(METRICS_PORT)
+
+    session = _create_session()
+    api = _create_multi_region_api(session) if SERVICE_RESOURCES else _create_api(session)
 
-    while not completed:
-        # wait for 5 seconds before refreshing the transcription status
-        time.sleep(5)
+    # See transcribe() for supported properties.
+    properties = {}
 
-        transcription = api.get_transcription(transcription_id)
-        logging.info(f"Transcriptions status: {transcription.status}")
+    uris = read_manifest(RECORDINGS_MANIFEST)
+    if PREFLIGHT_DIRECTORY is not None:
+        uris = _skip_rejected(uris, PREFLIGHT_DIRECTORY)
 
-        if transcription.status in ("Failed", "Succeeded"):
-            completed = True
+    if TARGET_TRANSCRIPTION_DURATION is not None:
+        # the durations are read from the WAV headers of all recordings before submitting
+        durations = recording_durations(uris, session, max_workers=MAX_CONCURRENT_SUBMISSIONS)
+        chunks = pack_by_duration(durations, TARGET_TRANSCRIPTION_DURATION, RECORDINGS_PER_TRANSCRIPTION)
+        logging.info(f"Packed {len(durations)} recordings into {len(chunks)} transcriptions")
+    else:
+        chunks = _chunks(uris, RECORDINGS_PER_TRANSCRIPTION)
 
-        if transcription.status == "Succeeded":
-            pag_files = api.get_transcription_files(transcription_id)
-            for file_data in _paginate(api, pag_files):
-                if file_data.kind != "Transcription":
-                    continue
+    transcription_definitions = (transcribe_from_blobs(chunk, properties) for chunk in chunks)
 
-                audiofilename = file_data.name
-                results_url = file_data.links.content_url
-                results = requests.get(results_url)
-                logging.info(f"Results for {audiofilename}:\n{results.content.decode('utf-8')}")
-        elif transcription.status == "Failed":
-            logging.info(f"Transcription failed: {transcription.properties.error.message}")
+    # The manifest is grouped into transcriptions before the result cache is consulted, so that the
+    # same definitions and journal keys result after a restart. Recordings whose results are
+    # cached from earlier transcriptions are then removed from the definitions that are submitted.
+    cache = ResultCache(RESULT_CACHE_DIRECTORY, RESULT_CACHE_MAX_BYTES)
+    _run_transcriptions(api, transcription_definitions, cache, session, JOURNAL_PATH)
 
 
 if __name__ == "__main__":
     transcribe()
 
+    # Comment the line above and uncomment this line to transcribe all recordings listed in
+    # RECORDINGS_MANIFEST.
+    # transcribe_manifest()
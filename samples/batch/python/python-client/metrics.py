@@ -0,0 +1,292 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+
+import bisect
+import http.server
+import logging
+import math
+import re
+import socket
+import threading
+import urllib.parse
+
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+# buckets in seconds for the latency of requests
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# buckets in seconds for the time a transcription spends in a status, from seconds to hours
+STATE_DURATION_BUCKETS = (1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1200.0, 1800.0, 3600.0, 7200.0,
+                          14400.0, 28800.0, 86400.0)
+
+_ID = re.compile(r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}")
+
+
+def endpoint(url):
+    """
+    Return the path of `url` with the ids of entities replaced by `{id}`, so that all requests for
+    the same kind of entity are recorded under the same label.
+    """
+    return _ID.sub("{id}", urllib.parse.urlsplit(url).path)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for value in labels.values())
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        self._registry = registry if registry is not None else REGISTRY
+        self._registry.register(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} requires the labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key):
+        return dict(zip(self.labelnames, key))
+
+    def samples(self):
+        """
+        Return the samples of the metric as a list of tuples `(name, labels, value)`.
+        """
+        with self._lock:
+            return [(self.name, self._labels(key), value) for key, value in sorted(self._values.items())]
+
+
+class Counter(_Metric):
+    """
+    A value that only increases, such as the number of requests sent.
+    """
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        if amount < 0:
+            raise ValueError("counters can only be increased")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        self._registry.emit(self, labels, amount)
+
+    def get(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        return [(f"{name}_total", labels, value) for name, labels, value in super().samples()]
+
+
+class Gauge(_Metric):
+    """
+    A value that goes up and down, such as the number of running transcriptions.
+    """
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+        self._registry.emit(self, labels, value)
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            value = self._values[key] = self._values.get(key, 0) + amount
+        self._registry.emit(self, labels, value)
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def get(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Histogram(_Metric):
+    """
+    The distribution of observed values, such as request latencies, counted in `buckets` of
+    increasing upper bounds.
+    """
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # counts per bucket, with a last bucket for values above all bounds, and the sum
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += value
+        self._registry.emit(self, labels, value)
+
+    def samples(self):
+        samples = []
+        for name, labels, (counts, total) in super().samples():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                samples.append((f"{name}_bucket", dict(labels, le=_format_value(bound)), cumulative))
+            samples.append((f"{name}_count", labels, cumulative))
+            samples.append((f"{name}_sum", labels, total))
+        return samples
+
+
+class Registry:
+    """
+    Collection of metrics that can be rendered in the OpenMetrics text format, for scraping by
+    Prometheus or other monitoring systems.
+
+    Sinks added with `add_sink` receive every update as it happens, to push the metrics to
+    systems that are not scraping. A sink is an object with a method `record(metric, labels, value)`,
+    which is called with the increment of counters, the new value of gauges, and the observed
+    value of histograms. It is called on the thread that records the value and should not block.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._sinks = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"a metric named {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+
+    def get(self, name):
+        return self._metrics[name]
+
+    def add_sink(self, sink):
+        with self._lock:
+            self._sinks.append(sink)
+
+    def remove_sink(self, sink):
+        with self._lock:
+            self._sinks.remove(sink)
+
+    def emit(self, metric, labels, value):
+        for sink in self._sinks:
+            try:
+                sink.record(metric, labels, value)
+            except Exception as exc:
+                # metrics must not break the client
+                logging.debug(f"Metrics sink {sink!r} failed: {exc!r}")
+
+    def render(self):
+        """
+        Return all metrics in the OpenMetrics text format.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+
+        lines = []
+        for metric in metrics:
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+class StatsdSink:
+    """
+    Metrics sink that sends every update as a StatsD datagram over UDP to `host`:`port`. Labels
+    are appended as tags in the DogStatsD format.
+    """
+
+    _TYPES = {"counter": "c", "gauge": "g", "histogram": "ms"}
+
+    def __init__(self, host="127.0.0.1", port=8125, prefix=""):
+        self._address = (host, port)
+        self._prefix = prefix
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def record(self, metric, labels, value):
+        if metric.kind == "histogram" and metric.name.endswith("_seconds"):
+            # timers are in milliseconds
+            value *= 1000
+        tags = "|#" + ",".join(f"{name}:{label}" for name, label in labels.items()) if labels else ""
+        datagram = f"{self._prefix}{metric.name}:{_format_value(value)}|{self._TYPES[metric.kind]}{tags}"
+        self._socket.sendto(datagram.encode("utf-8"), self._address)
+
+    def close(self):
+        self._socket.close()
+
+
+class _MetricsHandler(http.server.BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if urllib.parse.urlsplit(self.path).path != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", OPENMETRICS_CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_metrics_server(port, host="0.0.0.0", registry=None):
+    """
+    Serve the metrics of `registry`, by default those of the batch client, at
+    `http://<host>:<port>/metrics` on a background thread, and return the server.
+    """
+    server = http.server.ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    server.registry = registry if registry is not None else REGISTRY
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+REGISTRY = Registry()
+
+# metrics of the batch client
+TRANSCRIPTIONS_SUBMITTED = Counter(
+    "batch_transcriptions_submitted", "Transcriptions created by the client")
+TRANSCRIPTIONS = Gauge(
+    "batch_transcriptions", "Tracked transcriptions by their last polled status", ["status"])
+TRANSCRIPTIONS_COMPLETED = Counter(
+    "batch_transcriptions_completed", "Transcriptions that have succeeded or failed", ["status"])
+TRANSCRIPTION_STATE_DURATION = Histogram(
+    "batch_transcription_state_duration_seconds",
+    "Time a transcription has spent in a status, accurate to the polling interval", ["status"],
+    buckets=STATE_DURATION_BUCKETS)
+API_REQUEST_DURATION = Histogram(
+    "batch_api_request_duration_seconds", "Latency of each attempt of a request to the speech service",
+    ["method", "endpoint", "status"])
+API_RETRIES = Counter(
+    "batch_api_retries", "Requests to the speech service that have been retried", ["method", "endpoint"])
+RESULT_FILES_DOWNLOADED = Counter(
+    "batch_result_files_downloaded", "Result files that have been downloaded or have failed to download", ["outcome"])
+RESULT_BYTES_DOWNLOADED = Counter(
+    "batch_result_downloaded_bytes", "Bytes of result files downloaded")
@@ -0,0 +1,458 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+
+"""
+Local stand-in for the transcription endpoints of the Speech to Text API v3.0, for testing and
+benchmarking the batch clients without using the real service.
+"""
+
+import argparse
+import base64
+import datetime
+import functools
+import hashlib
+import heapq
+import hmac
+import http.server
+import json
+import random
+import re
+import threading
+import time
+import urllib.parse
+import urllib.request
+import uuid
+
+BASE_PATH = "/speechtotext/v3.0"
+
+
+def _iso_now():
+    return datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _ticks(seconds):
+    return int(seconds * 10 ** 7)
+
+
+def _duration(seconds):
+    return f"PT{seconds:.2f}S"
+
+
+def result_document(content_url, phrases):
+    """
+    Return a transcription result document for `content_url` with `phrases` recognized phrases.
+    """
+    recognized_phrases = []
+    for i in range(phrases):
+        offset = 3.0 * i
+        words = [{
+            "word": word,
+            "offset": _duration(offset + 0.4 * j),
+            "duration": _duration(0.4),
+            "offsetInTicks": float(_ticks(offset + 0.4 * j)),
+            "durationInTicks": float(_ticks(0.4)),
+            "confidence": 0.9,
+        } for j, word in enumerate(("hello", "from", "the", "mock", "server"))]
+        recognized_phrases.append({
+            "recognitionStatus": "Success",
+            "channel": 0,
+            "speaker": 1 + i % 2,
+            "offset": _duration(offset),
+            "duration": _duration(2.0),
+            "offsetInTicks": float(_ticks(offset)),
+            "durationInTicks": float(_ticks(2.0)),
+            "nBest": [{
+                "confidence": 0.9,
+                "lexical": "hello from the mock server",
+                "itn": "hello from the mock server",
+                "maskedITN": "hello from the mock server",
+                "display": "Hello from the mock server.",
+                "words": words,
+            }],
+        })
+
+    return {
+        "source": content_url,
+        "timestamp": _iso_now(),
+        "durationInTicks": _ticks(3.0 * phrases),
+        "duration": _duration(3.0 * phrases),
+        "combinedRecognizedPhrases": [{
+            "channel": 0,
+            "lexical": " ".join(["hello from the mock server"] * phrases),
+            "itn": " ".join(["hello from the mock server"] * phrases),
+            "maskedITN": " ".join(["hello from the mock server"] * phrases),
+            "display": " ".join(["Hello from the mock server."] * phrases),
+        }],
+        "recognizedPhrases": recognized_phrases,
+    }
+
+
+class MockSpeechService:
+    """
+    In-memory state and behavior of the mocked service.
+
+    Every request is delayed by `latency` seconds and fails with probability `failure_rate`,
+    either with status 429 and a `Retry-After` header or with status 500. Lists are returned in
+    pages of `page_size` items. Transcriptions are not started for the first fifth of
+    `job_duration` seconds, then running, and then succeed, or fail with probability
+    `job_failure_rate`. Each result file contains `phrases_per_file` recognized phrases.
+    Registered web hooks are validated and notified when a transcription that was created while a
+    web hook was registered has completed.
+    """
+
+    def __init__(self, latency=0.0, failure_rate=0.0, page_size=100, job_duration=5.0,
+                 job_failure_rate=0.0, phrases_per_file=10):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.page_size = page_size
+        self.job_duration = job_duration
+        self.job_failure_rate = job_failure_rate
+        self.phrases_per_file = phrases_per_file
+        self.requests = 0
+        self.connections = 0
+        self._transcriptions = {}
+        self._hooks = {}
+        # heap of (completion time, transcription id, base url) of transcriptions to notify about,
+        # entries are removed once they are due
+        self._completions = []
+        self._notifier = None
+        self._condition = threading.Condition()
+        self.notifications = 0
+        self._lock = threading.Lock()
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def count_connection(self):
+        with self._lock:
+            self.connections += 1
+
+    def create(self, definition, base_url=None):
+        transcription_id = str(uuid.uuid4())
+        created = time.monotonic()
+        with self._lock:
+            self._transcriptions[transcription_id] = {
+                "definition": definition,
+                "created": created,
+                "createdDateTime": _iso_now(),
+                "failed": random.random() < self.job_failure_rate,
+            }
+        with self._condition:
+            # without a web hook nobody is notified, so the heap does not grow under load tests
+            if self._hooks:
+                heapq.heappush(self._completions, (created + self.job_duration, transcription_id, base_url))
+                self._condition.notify()
+        return transcription_id
+
+    def create_hook(self, definition):
+        """
+        Register the web hook `definition` after validating its url, and return the id of the web
+        hook, or None if the validation failed.
+        """
+        token = str(uuid.uuid4())
+        separator = "&" if "?" in definition["webUrl"] else "?"
+        try:
+            request = urllib.request.Request(f"{definition['webUrl']}{separator}validationToken={token}", b"",
+                                             method="POST")
+            with urllib.request.urlopen(request, timeout=10) as response:
+                if response.read().decode("utf-8") != token:
+                    return None
+        except OSError:
+            return None
+
+        hook_id = str(uuid.uuid4())
+        with self._condition:
+            self._hooks[hook_id] = definition
+            if self._notifier is None:
+                self._notifier = threading.Thread(target=self._notify_completions, daemon=True)
+                self._notifier.start()
+        return hook_id
+
+    def delete_hook(self, hook_id):
+        with self._condition:
+            return self._hooks.pop(hook_id, None) is not None
+
+    def _notify_completions(self):
+        while True:
+            with self._condition:
+                while not self._completions or self._completions[0][0] > time.monotonic():
+                    self._condition.wait(self._completions[0][0] - time.monotonic() if self._completions else None)
+                _, transcription_id, base_url = heapq.heappop(self._completions)
+                hooks = [hook for hook in self._hooks.values()
+                         if (hook.get("events") or {}).get("transcriptionCompletion")]
+            if transcription_id not in self._transcriptions:
+                continue
+
+            body = json.dumps({"self": f"{base_url}/transcriptions/{transcription_id}",
+                               "invocationId": str(uuid.uuid4())}).encode("utf-8")
+            for hook in hooks:
+                headers = {"Content-Type": "application/json", "X-MicrosoftSpeechServices-Event": "TranscriptionCompletion"}
+                secret = (hook.get("properties") or {}).get("secret")
+                if secret:
+                    digest = hmac.new(secret.encode("utf-8"), body, hashlib.sha256).digest()
+                    headers["X-MicrosoftSpeechServices-Signature"] = base64.b64encode(digest).decode("ascii")
+                try:
+                    urllib.request.urlopen(urllib.request.Request(hook["webUrl"], body, headers), timeout=10).close()
+                    with self._lock:
+                        self.notifications += 1
+                except OSError:
+                    pass
+
+    def delete(self, transcription_id):
+        with self._lock:
+            return self._transcriptions.pop(transcription_id, None) is not None
+
+    def status(self, transcription_id):
+        with self._lock:
+            return self._status(self._transcriptions[transcription_id])
+
+    def _status(self, record):
+        elapsed = time.monotonic() - record["created"]
+        if elapsed < self.job_duration / 5:
+            return "NotStarted"
+        if elapsed < self.job_duration:
+            return "Running"
+        return "Failed" if record["failed"] else "Succeeded"
+
+    def transcription_ids(self):
+        with self._lock:
+            return list(self._transcriptions)
+
+    def transcription_json(self, base_url, transcription_id):
+        with self._lock:
+            record = self._transcriptions.get(transcription_id)
+        if record is None:
+            return None
+
+        definition = record["definition"]
+        status = self._status(record)
+        properties = dict(definition.get("properties") or {})
+        if status == "Failed":
+            properties["error"] = {"code": "InvalidData", "message": "The mock server failed this transcription."}
+        return {
+            "self": f"{base_url}/transcriptions/{transcription_id}",
+            "links": {"files": f"{base_url}/transcriptions/{transcription_id}/files"},
+            "displayName": definition.get("displayName"),
+            "description": definition.get("description"),
+            "locale": definition.get("locale"),
+            "contentUrls": definition.get("contentUrls"),
+            "contentContainerUrl": definition.get("contentContainerUrl"),
+            "properties": properties,
+            "status": status,
+            "createdDateTime": record["createdDateTime"],
+            "lastActionDateTime": _iso_now(),
+        }
+
+    def files_json(self, base_url, transcription_id):
+        with self._lock:
+            record = self._transcriptions.get(transcription_id)
+        if record is None:
+            return None
+
+        content_urls = record["definition"].get("contentUrls") or [record["definition"].get("contentContainerUrl")]
+        files = [{
+            "self": f"{base_url}/transcriptions/{transcription_id}/files/{i}",
+            "name": f"contenturl_{i}.json",
+            "kind": "Transcription",
+            "links": {"contentUrl": f"{base_url}/results/{transcription_id}/{i}"},
+            "createdDateTime": record["createdDateTime"],
+        } for i in range(len(content_urls))]
+        files.append({
+            "self": f"{base_url}/transcriptions/{transcription_id}/files/report",
+            "name": "report.json",
+            "kind": "TranscriptionReport",
+            "links": {"contentUrl": f"{base_url}/results/{transcription_id}/report"},
+            "createdDateTime": record["createdDateTime"],
+        })
+        return files
+
+    def result_json(self, transcription_id, index):
+        with self._lock:
+            record = self._transcriptions.get(transcription_id)
+        if record is None:
+            return None
+        if index == "report":
+            return {"successfulTranscriptionsCount": len(record["definition"].get("contentUrls") or [1])}
+        content_urls = record["definition"].get("contentUrls") or [record["definition"].get("contentContainerUrl")]
+        return result_document(content_urls[int(index)], self.phrases_per_file)
+
+
+class _RequestHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    # send headers and body in one segment, the response is flushed after each request
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def setup(self):
+        super().setup()
+        self.service.count_connection()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _base_url(self):
+        return f"{self.server.scheme}://{self.headers['Host']}{BASE_PATH}"
+
+    def _send_json(self, status, body=None, headers=None):
+        data = json.dumps(body).encode("utf-8") if body is not None else b""
+        self.send_response(status)
+        if body is not None:
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_page(self, items, path, query, render=None):
+        # only the items of the requested page are rendered, items that render to None are omitted
+        skip = int(query.get("skip", ["0"])[0])
+        top = int(query.get("top", [str(self.service.page_size)])[0])
+        top = min(top, self.service.page_size)
+        values = items[skip:skip + top]
+        if render is not None:
+            values = [value for value in map(render, values) if value is not None]
+        body = {"values": values}
+        if skip + top < len(items):
+            body["@nextLink"] = f"{self.server.scheme}://{self.headers['Host']}{path}?skip={skip + top}&top={top}"
+        self._send_json(200, body)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _simulate(self):
+        """
+        Apply the latency and failure rate of the service, and return False if the request failed.
+        """
+        self.service.count_request()
+        if self.service.latency:
+            time.sleep(self.service.latency)
+        if random.random() < self.service.failure_rate:
+            if random.random() < 0.5:
+                self._send_json(429, {"code": "TooManyRequests"}, {"Retry-After": "1"})
+            else:
+                self._send_json(500, {"code": "InternalServerError"})
+            return False
+        return True
+
+    def _not_found(self):
+        self._send_json(404, {"code": "NotFound", "message": "The requested entity was not found."})
+
+    def do_POST(self):
+        definition = self._read_json()
+        path = urllib.parse.urlsplit(self.path).path
+        if not self._simulate():
+            return
+
+        if path == f"{BASE_PATH}/transcriptions":
+            transcription_id = self.service.create(definition, self._base_url())
+            body = self.service.transcription_json(self._base_url(), transcription_id)
+            self._send_json(201, body, {"Location": body["self"]})
+        elif path == f"{BASE_PATH}/webhooks":
+            hook_id = self.service.create_hook(definition)
+            if hook_id is None:
+                return self._send_json(400, {"code": "InvalidPayload", "message": "The web hook url could not be validated."})
+            location = f"{self._base_url()}/webhooks/{hook_id}"
+            self._send_json(201, {"self": location, "webUrl": definition["webUrl"]}, {"Location": location})
+        else:
+            self._not_found()
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        query = urllib.parse.parse_qs(url.query)
+        if not self._simulate():
+            return
+
+        base_url = self._base_url()
+        match = re.fullmatch(f"{BASE_PATH}/transcriptions(?:/([^/]+))?(/files)?", url.path)
+        result_match = re.fullmatch(f"{BASE_PATH}/results/([^/]+)/([^/]+)", url.path)
+        if match and match.group(1) is None:
+            self._send_page(self.service.transcription_ids(), url.path, query,
+                            functools.partial(self.service.transcription_json, base_url))
+        elif match and match.group(2) is None:
+            body = self.service.transcription_json(base_url, match.group(1))
+            if body is None:
+                return self._not_found()
+            self._send_json(200, body)
+        elif match:
+            files = self.service.files_json(base_url, match.group(1))
+            if files is None:
+                return self._not_found()
+            self._send_page(files, url.path, query)
+        elif result_match:
+            body = self.service.result_json(result_match.group(1), result_match.group(2))
+            if body is None:
+                return self._not_found()
+            self._send_json(200, body)
+        else:
+            self._not_found()
+
+    def do_DELETE(self):
+        path = urllib.parse.urlsplit(self.path).path
+        if not self._simulate():
+            return
+
+        match = re.fullmatch(f"{BASE_PATH}/transcriptions/([^/]+)", path)
+        hook_match = re.fullmatch(f"{BASE_PATH}/webhooks/([^/]+)", path)
+        if match and self.service.delete(match.group(1)):
+            self._send_json(204)
+        elif hook_match and self.service.delete_hook(hook_match.group(1)):
+            self._send_json(204)
+        else:
+            self._not_found()
+
+
+def start_mock_server(service=None, host="127.0.0.1", port=0, ssl_context=None):
+    """
+    Start the mock server for `service` in a background thread and return the server object. The
+    API base url for clients is available as `server.base_url`. Stop the server with
+    `server.shutdown()`. If the server-side `ssl.SSLContext` `ssl_context` is given, the server
+    accepts HTTPS connections only.
+    """
+    server = http.server.ThreadingHTTPServer((host, port), _RequestHandler)
+    server.daemon_threads = True
+    server.service = service if service is not None else MockSpeechService()
+    server.scheme = "http"
+    if ssl_context is not None:
+        # the handshake is done by the handler thread of the connection, not by the accepting thread
+        server.socket = ssl_context.wrap_socket(server.socket, server_side=True, do_handshake_on_connect=False)
+        server.scheme = "https"
+    server.base_url = f"{server.scheme}://{host}:{server.server_port}{BASE_PATH}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.05, help="latency of each request in seconds")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="probability that a request fails")
+    parser.add_argument("--page-size", type=int, default=100, help="maximum number of items per page")
+    parser.add_argument("--job-duration", type=float, default=5.0, help="duration of a transcription in seconds")
+    parser.add_argument("--job-failure-rate", type=float, default=0.0, help="probability that a transcription fails")
+    parser.add_argument("--phrases-per-file", type=int, default=10, help="number of phrases per result file")
+    args = parser.parse_args()
+
+    service = MockSpeechService(args.latency, args.failure_rate, args.page_size, args.job_duration,
+                                args.job_failure_rate, args.phrases_per_file)
+    server = start_mock_server(service, args.host, args.port)
+    print(f"Mock server listening on {server.base_url}, press Ctrl-C to stop")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
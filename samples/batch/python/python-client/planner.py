@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+
+import bisect
+import concurrent.futures
+import logging
+import struct
+import requests
+
+# number of bytes that are read to find the format and data chunks of a WAV file
+HEADER_SIZE = 64 * 1024
+
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+class WavHeader:
+    """
+    Format and location of the audio data of a RIFF/WAVE file. `sub_format` is the format tag
+    in the sub-format GUID of a `WAVE_FORMAT_EXTENSIBLE` file, or None.
+    """
+
+    def __init__(self, format_tag, channels, sample_rate, byte_rate, block_align, bits_per_sample,
+                 data_offset, data_size, sub_format=None):
+        self.format_tag = format_tag
+        self.channels = channels
+        self.sample_rate = sample_rate
+        self.byte_rate = byte_rate
+        self.block_align = block_align
+        self.bits_per_sample = bits_per_sample
+        self.data_offset = data_offset
+        self.data_size = data_size
+        self.sub_format = sub_format
+
+    @property
+    def sample_format(self):
+        """Format tag of the samples, the sub-format of `WAVE_FORMAT_EXTENSIBLE` files."""
+        return self.sub_format if self.format_tag == WAVE_FORMAT_EXTENSIBLE else self.format_tag
+
+    @property
+    def duration(self):
+        """Duration of the audio data in seconds."""
+        return self.data_size / self.byte_rate if self.byte_rate else 0.0
+
+
+def parse_wav_header(data, file_size=None):
+    """
+    Parse the header of a WAV file from `data`, a bytes-like object with at least the beginning
+    of the file up to the start of the audio data. `file_size` is the total size of the file, if
+    known. It is used for files whose data chunk size is not set, such as streamed recordings.
+
+    Raises a ValueError if `data` does not start with a valid WAV header.
+    """
+    if len(data) < 12 or data[0:4] != b"RIFF" or data[8:12] != b"WAVE":
+        raise ValueError("not a RIFF/WAVE file")
+
+    fmt = None
+    sub_format = None
+    position = 12
+    while position + 8 <= len(data):
+        chunk_id = bytes(data[position:position + 4])
+        chunk_size, = struct.unpack_from("<I", data, position + 4)
+        body = position + 8
+        if chunk_id == b"fmt ":
+            if chunk_size < 16 or body + 16 > len(data):
+                raise ValueError("invalid fmt chunk")
+            fmt = struct.unpack_from("<HHIIHH", data, body)
+            if fmt[0] == WAVE_FORMAT_EXTENSIBLE and chunk_size >= 40 and body + 40 <= len(data):
+                # the sub-format GUID starts with the format tag of the samples
+                sub_format, = struct.unpack_from("<H", data, body + 24)
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise ValueError("data chunk before fmt chunk")
+            if file_size is not None and (chunk_size in (0, 0xFFFFFFFF) or body + chunk_size > file_size):
+                chunk_size = file_size - body
+            return WavHeader(*fmt, data_offset=body, data_size=chunk_size, sub_format=sub_format)
+        # chunks are padded to an even size
+        position = body + chunk_size + (chunk_size & 1)
+
+    raise ValueError("no data chunk found in the header")
+
+
+def wav_duration(path):
+    """
+    Return the duration in seconds of the local WAV file at `path`.
+    """
+    with open(path, "rb") as wav_file:
+        data = wav_file.read(HEADER_SIZE)
+        wav_file.seek(0, 2)
+        return parse_wav_header(data, wav_file.tell()).duration
+
+
+def blob_duration(uri, session=None):
+    """
+    Return the duration in seconds of the WAV blob at `uri`. The duration is taken from the blob
+    metadata `duration` if it is set, otherwise from the header of the WAV file, for which only
+    the first bytes of the blob are requested.
+    """
+    session = session if session is not None else requests
+    with session.get(uri, headers={"Range": f"bytes=0-{HEADER_SIZE - 1}"}, stream=True, timeout=30) as response:
+        response.raise_for_status()
+        metadata_duration = response.headers.get("x-ms-meta-duration")
+        if metadata_duration is not None:
+            return float(metadata_duration)
+
+        file_size = None
+        content_range = response.headers.get("Content-Range")
+        if content_range and "/" in content_range:
+            total = content_range.rsplit("/", 1)[1]
+            file_size = int(total) if total.isdigit() else None
+        elif response.status_code == 200 and response.headers.get("Content-Length"):
+            file_size = int(response.headers["Content-Length"])
+
+        data = response.raw.read(HEADER_SIZE)
+    return parse_wav_header(data, file_size).duration
+
+
+def recording_durations(uris, session=None, max_workers=8):
+    """
+    Return a list of tuples `(uri, duration)` for the recordings at `uris`, which are blob URIs
+    or local paths. The durations are read in parallel. The duration is None for recordings
+    whose duration could not be determined.
+    """
+    def duration(uri):
+        try:
+            if uri.startswith(("http://", "https://")):
+                return blob_duration(uri, session)
+            return wav_duration(uri)
+        except (requests.RequestException, OSError, ValueError) as exc:
+            logging.warning(f"Could not determine the duration of recording {uri.split('?')[0]}: {exc}")
+            return None
+
+    uris = list(uris)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(zip(uris, executor.map(duration, uris)))
+
+
+def pack_by_duration(recordings, target_duration, max_recordings=None):
+    """
+    Pack `recordings`, a list of tuples `(uri, duration)`, into jobs with a total duration of at
+    most `target_duration` seconds and at most `max_recordings` recordings each, and return the
+    list of jobs as lists of URIs.
+
+    Recordings are placed with the best-fit-decreasing heuristic: longest first, each into the
+    job with the least remaining capacity that can hold it. This yields few jobs of similar total
+    duration. Recordings longer than `target_duration` get a job of their own, and recordings of
+    unknown duration are packed by count into separate jobs.
+    """
+    known = sorted((item for item in recordings if item[1] is not None), key=lambda item: item[1], reverse=True)
+    unknown = [uri for uri, duration in recordings if duration is None]
+
+    jobs = []
+    # sorted list of (remaining capacity, job index) of jobs that can take more recordings
+    open_jobs = []
+    for uri, duration in known:
+        position = bisect.bisect_left(open_jobs, (duration, -1))
+        if position < len(open_jobs):
+            remaining, index = open_jobs.pop(position)
+        else:
+            remaining, index = target_duration, len(jobs)
+            jobs.append([])
+
+        jobs[index].append(uri)
+        remaining -= duration
+        if remaining > 0 and (max_recordings is None or len(jobs[index]) < max_recordings):
+            bisect.insort(open_jobs, (remaining, index))
+
+    step = max_recordings or len(unknown) or 1
+    jobs.extend(unknown[i:i + step] for i in range(0, len(unknown), step))
+    return jobs
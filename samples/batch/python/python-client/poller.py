@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+
+import email.utils
+import heapq
+import logging
+import queue
+import random
+import threading
+import time
+import swagger_client as cris_client
+import urllib3
+from metrics import TRANSCRIPTION_STATE_DURATION, TRANSCRIPTIONS, TRANSCRIPTIONS_COMPLETED
+
+COMPLETED_STATES = ("Failed", "Succeeded")
+
+
+def parse_retry_after(headers):
+    """
+    Return the number of seconds the `Retry-After` header in `headers` asks to wait, or None if
+    the header is missing or invalid. Both the delay-seconds and the HTTP-date format are supported.
+    """
+    value = (headers or {}).get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class _TrackedTranscription:
+    def __init__(self, transcription_id, interval):
+        self.transcription_id = transcription_id
+        self.status = None
+        # time at which the transcription has been seen in its current status first
+        self.status_since = time.monotonic()
+        self.interval = interval
+        # sequence number of the current entry in the schedule, older entries are skipped
+        self.sequence = None
+
+
+class TranscriptionPoller:
+    """
+    Tracks the status of many transcriptions with a single polling loop.
+
+    Each transcription is polled with its own exponentially growing interval, which is reset to
+    `initial_interval` whenever its status changes. Jitter spreads the requests over time, and a
+    `Retry-After` header returned by the service delays all further requests accordingly.
+    `on_completed(transcription_id, transcription)` is called once a transcription has
+    succeeded or failed, after which it is no longer tracked, and exceptions it raises are logged.
+    Failed requests, including connection errors, are retried with backoff. `notify` polls a
+    transcription immediately, for example when the service has sent a notification that it completed.
+    """
+
+    def __init__(self, api, on_completed=None, initial_interval=2.0, max_interval=60.0, multiplier=2.0):
+        self._api = api
+        self._on_completed = on_completed
+        self._initial_interval = initial_interval
+        self._max_interval = max_interval
+        self._multiplier = multiplier
+
+        # heap of (next poll time, sequence number, tracked transcription)
+        self._schedule = []
+        self._sequence = 0
+        self._tracked = {}
+        self._not_before = 0.0
+        self._notifications = queue.SimpleQueue()
+        self._wakeup = threading.Event()
+        self.requests = 0
+
+    def __len__(self):
+        return len(self._tracked)
+
+    def add(self, transcription_id):
+        """
+        Start tracking the transcription `transcription_id`.
+        """
+        tracked = _TrackedTranscription(transcription_id, self._initial_interval)
+        self._tracked[transcription_id] = tracked
+        self._reschedule(tracked, time.monotonic())
+
+    def notify(self, transcription_id):
+        """
+        Poll the transcription `transcription_id` as soon as possible. Can be called from any thread.
+        """
+        self._notifications.put(transcription_id)
+        self._wakeup.set()
+
+    def _reschedule(self, tracked, now, delay=None):
+        if delay is None:
+            # equal jitter: wait at least half of the interval
+            delay = tracked.interval / 2 + random.uniform(0, tracked.interval / 2)
+        self._sequence += 1
+        tracked.sequence = self._sequence
+        heapq.heappush(self._schedule, (now + delay, self._sequence, tracked))
+
+    def _next_poll_time(self):
+        return max(self._schedule[0][0], self._not_before)
+
+    def poll_due(self):
+        """
+        Poll all transcriptions that are due without waiting, and return the number of requests sent.
+        """
+        while True:
+            try:
+                tracked = self._tracked.get(self._notifications.get_nowait())
+            except queue.Empty:
+                break
+            if tracked is not None:
+                self._reschedule(tracked, time.monotonic(), 0.0)
+
+        sent = 0
+        while self._schedule and self._next_poll_time() <= time.monotonic():
+            _, sequence, tracked = heapq.heappop(self._schedule)
+            if sequence != tracked.sequence:
+                # the transcription has been rescheduled since
+                continue
+            self._poll(tracked)
+            sent += 1
+        return sent
+
+    def _poll(self, tracked):
+        self.requests += 1
+        try:
+            transcription, status, headers = self._api.get_transcription_with_http_info(tracked.transcription_id)
+        except (cris_client.rest.ApiException, urllib3.exceptions.HTTPError) as exc:
+            # urllib3 raises its own errors once the retries of a connection are exhausted
+            if getattr(exc, "status", None) == 404:
+                logging.error(f"Transcription {tracked.transcription_id} does not exist anymore, it is no longer tracked")
+                self._tracked.pop(tracked.transcription_id, None)
+                if tracked.status is not None:
+                    TRANSCRIPTIONS.dec(status=tracked.status)
+                return
+
+            now = time.monotonic()
+            retry_after = parse_retry_after(getattr(exc, "headers", None))
+            if retry_after is not None:
+                # the service is throttling the whole resource, so hold back every request
+                self._not_before = max(self._not_before, now + retry_after)
+            logging.warning(f"Could not get status of transcription {tracked.transcription_id}: {exc}")
+            tracked.interval = min(tracked.interval * self._multiplier, self._max_interval)
+            self._reschedule(tracked, now, retry_after)
+            return
+
+        now = time.monotonic()
+        if transcription.status != tracked.status:
+            logging.info(f"Transcription {tracked.transcription_id} status: {transcription.status}")
+            self._record_status_change(tracked, transcription.status, now)
+            tracked.status = transcription.status
+            tracked.interval = self._initial_interval
+        else:
+            tracked.interval = min(tracked.interval * self._multiplier, self._max_interval)
+
+        if transcription.status in COMPLETED_STATES:
+            self._tracked.pop(tracked.transcription_id, None)
+            TRANSCRIPTIONS_COMPLETED.inc(status=transcription.status)
+            if self._on_completed is not None:
+                try:
+                    self._on_completed(tracked.transcription_id, transcription)
+                except Exception:
+                    # a failed download must not stop polling the other transcriptions
+                    logging.exception(f"Could not handle completed transcription {tracked.transcription_id}")
+            return
+
+        retry_after = parse_retry_after(headers)
+        if retry_after is not None:
+            retry_after = max(retry_after, tracked.interval / 2)
+        self._reschedule(tracked, now, retry_after)
+
+    def _record_status_change(self, tracked, status, now):
+        if tracked.status is not None:
+            TRANSCRIPTIONS.dec(status=tracked.status)
+            TRANSCRIPTION_STATE_DURATION.observe(now - tracked.status_since, status=tracked.status)
+            tracked.status_since = now
+        elif status != "NotStarted":
+            # the time in the earlier statuses is unknown
+            tracked.status_since = now
+        if status not in COMPLETED_STATES:
+            TRANSCRIPTIONS.inc(status=status)
+
+    def run(self):
+        """
+        Poll until all tracked transcriptions have completed.
+        """
+        while self._tracked:
+            delay = self._next_poll_time() - time.monotonic()
+            if delay > 0:
+                # notifications interrupt the wait
+                self._wakeup.wait(delay)
+                self._wakeup.clear()
+            self.poll_due()
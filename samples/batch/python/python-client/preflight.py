@@ -0,0 +1,278 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+
+"""
+Check local WAV recordings before they are transcribed: the header, format, duration, and
+energy of each recording in a directory or manifest are checked in parallel, so that corrupt,
+unsupported, or silent recordings are found without a round-trip to the service.
+"""
+
+import argparse
+import concurrent.futures
+import functools
+import itertools
+import logging
+import math
+import mmap
+import os
+import sys
+from planner import WAVE_FORMAT_EXTENSIBLE, parse_wav_header
+
+try:
+    import numpy as np
+except ImportError:
+    # only required for checking the energy of recordings
+    np = None
+
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+
+SAMPLE_RATES = (8000, 16000, 22050, 24000, 32000, 44100, 48000)
+# recordings larger than this are rejected by the service
+MAX_FILE_SIZE = 1 << 30
+# recordings whose RMS level in dB relative to full scale is below this are considered silent
+SILENCE_THRESHOLD_DBFS = -50.0
+# fraction of samples at full scale above which a recording is flagged as clipped
+CLIPPING_RATIO = 0.001
+# number of samples that are converted to floating point at a time
+BLOCK_SAMPLES = 1 << 20
+
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".ogg", ".opus")
+
+
+class PreflightResult:
+    """
+    Result of checking the recording at `path`. `errors` lists the reasons for rejecting the
+    recording, and `warnings` lists problems that do not prevent a transcription.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.errors = []
+        self.warnings = []
+        self.sample_rate = None
+        self.channels = None
+        self.bits_per_sample = None
+        self.duration = None
+        self.rms_dbfs = None
+        self.peak_dbfs = None
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def __str__(self):
+        details = ", ".join(f"{name} {value}" for name, value in (
+            ("sample rate", self.sample_rate), ("channels", self.channels), ("duration", _rounded(self.duration)),
+            ("rms dBFS", _rounded(self.rms_dbfs))) if value is not None)
+        problems = "; ".join(self.errors + self.warnings)
+        return f"{'OK' if self.ok else 'REJECTED'} {self.path} ({details}){': ' + problems if problems else ''}"
+
+
+def _rounded(value):
+    return round(value, 1) if value is not None else None
+
+
+def _dbfs(value):
+    return 20 * math.log10(value) if value > 0 else -math.inf
+
+
+def _sample_blocks(buffer, header, block_samples):
+    # yield the samples of the data chunk as float64 arrays scaled to [-1, 1], without copying
+    # more than `block_samples` samples of the file at a time
+    bytes_per_sample = header.bits_per_sample // 8
+    count = header.data_size // bytes_per_sample
+    if header.sample_format == WAVE_FORMAT_IEEE_FLOAT:
+        dtype, scale = {4: "<f4", 8: "<f8"}[bytes_per_sample], 1.0
+    elif bytes_per_sample == 3:
+        dtype, scale = np.uint8, float(1 << 23)
+    else:
+        dtype, scale = {1: np.uint8, 2: "<i2", 4: "<i4"}[bytes_per_sample], float(1 << (header.bits_per_sample - 1))
+
+    if bytes_per_sample == 3:
+        data = np.frombuffer(buffer, dtype, count * 3, header.data_offset).reshape(-1, 3)
+    else:
+        data = np.frombuffer(buffer, dtype, count, header.data_offset)
+
+    for start in range(0, count, block_samples):
+        block = data[start:start + block_samples]
+        if bytes_per_sample == 3:
+            # little-endian 24 bit integers, sign extended by the arithmetic shift
+            block = (block[:, 0].astype(np.int32) << 8 | block[:, 1].astype(np.int32) << 16
+                     | block[:, 2].astype(np.int32) << 24) >> 8
+        samples = block.astype(np.float64)
+        if bytes_per_sample == 1:
+            # 8 bit samples are unsigned
+            samples -= 128.0
+        yield samples / scale
+
+
+def _check_energy(result, buffer, header, silence_threshold, block_samples):
+    squares = 0.0
+    peak = 0.0
+    clipped = 0
+    count = 0
+    for samples in _sample_blocks(buffer, header, block_samples):
+        squares += float(np.dot(samples, samples))
+        magnitudes = np.abs(samples)
+        peak = max(peak, float(magnitudes.max(initial=0.0)))
+        clipped += int(np.count_nonzero(magnitudes >= 0.999))
+        count += len(samples)
+
+    if count == 0:
+        return
+    result.rms_dbfs = _dbfs(math.sqrt(squares / count))
+    result.peak_dbfs = _dbfs(peak)
+    if result.rms_dbfs < silence_threshold:
+        result.errors.append(f"silent, the level is {_rounded(result.rms_dbfs)} dBFS")
+    elif clipped > CLIPPING_RATIO * count:
+        result.warnings.append(f"clipped, {clipped} samples at full scale")
+
+
+def check_recording(path, sample_rates=SAMPLE_RATES, min_duration=0.5, max_duration=None,
+                    silence_threshold=SILENCE_THRESHOLD_DBFS, check_energy=True, block_samples=BLOCK_SAMPLES):
+    """
+    Check the local recording at `path` and return a `PreflightResult`.
+
+    WAV recordings are rejected if their header is corrupt or truncated, if the format is not
+    PCM or floating point with one or two channels and a sample rate in `sample_rates`, if they
+    are shorter than `min_duration` or longer than `max_duration` seconds, or if their RMS level
+    is below `silence_threshold` dBFS. The file is memory-mapped, and the level is computed with
+    NumPy in blocks of `block_samples` samples, so that large files are not read into memory.
+    Other audio formats are only checked for their size.
+    """
+    result = PreflightResult(path)
+    try:
+        file_size = os.path.getsize(path)
+    except OSError as exc:
+        result.errors.append(f"cannot be read: {exc}")
+        return result
+
+    if file_size > MAX_FILE_SIZE:
+        result.errors.append(f"larger than {MAX_FILE_SIZE} bytes")
+    if not path.lower().endswith(".wav"):
+        result.warnings.append("not a WAV file, only the size has been checked")
+        return result
+    if file_size == 0:
+        result.errors.append("empty file")
+        return result
+
+    with open(path, "rb") as wav_file, mmap.mmap(wav_file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        try:
+            header = parse_wav_header(buffer)
+        except (ValueError, IndexError) as exc:
+            # an index error is raised for chunks that are cut off
+            result.errors.append(f"invalid WAV header: {exc}")
+            return result
+
+        if header.data_size in (0, 0xFFFFFFFF):
+            # streamed recordings may not have set the size of the data chunk
+            result.warnings.append("the size of the data chunk is not set")
+            header = parse_wav_header(buffer, file_size)
+        elif header.data_offset + header.data_size > file_size:
+            result.errors.append(f"truncated, {header.data_offset + header.data_size - file_size} bytes of audio are missing")
+            header = parse_wav_header(buffer, file_size)
+
+        result.sample_rate = header.sample_rate
+        result.channels = header.channels
+        result.bits_per_sample = header.bits_per_sample
+        result.duration = header.duration
+
+        if header.format_tag == WAVE_FORMAT_EXTENSIBLE and header.sub_format is None:
+            supported = False
+            result.errors.append("extensible format without a sub-format")
+        elif header.sample_format == WAVE_FORMAT_IEEE_FLOAT:
+            supported = header.bits_per_sample in (32, 64)
+        else:
+            supported = header.sample_format == WAVE_FORMAT_PCM and header.bits_per_sample in (8, 16, 24, 32)
+        if not supported and header.sample_format is not None:
+            result.errors.append(f"unsupported format {header.sample_format} with {header.bits_per_sample} bits per sample")
+        if header.channels not in (1, 2):
+            result.errors.append(f"{header.channels} channels, only mono and stereo are supported")
+        if header.sample_rate not in sample_rates:
+            result.errors.append(f"unsupported sample rate {header.sample_rate} Hz")
+        if header.block_align != header.channels * header.bits_per_sample // 8:
+            result.errors.append(f"inconsistent block alignment {header.block_align}")
+        elif header.block_align and header.data_size % header.block_align:
+            result.warnings.append("the audio data ends with a partial sample")
+        if header.duration < min_duration:
+            result.errors.append(f"shorter than {min_duration} seconds")
+        if max_duration is not None and header.duration > max_duration:
+            result.errors.append(f"longer than {max_duration} seconds")
+
+        if check_energy and supported and not result.errors:
+            if np is None:
+                raise RuntimeError("numpy is required for checking the level of recordings, "
+                                   "install it with `pip install numpy`")
+            _check_energy(result, buffer, header, silence_threshold, block_samples)
+
+    return result
+
+
+def list_recordings(source):
+    """
+    Return the paths of the audio files in the directory `source` and its subdirectories, or of
+    the recordings listed in the manifest file `source`, one path per line.
+    """
+    if os.path.isdir(source):
+        return sorted(os.path.join(directory, name) for directory, _, names in os.walk(source)
+                      for name in names if name.lower().endswith(AUDIO_EXTENSIONS))
+    with open(source, encoding="utf-8") as manifest:
+        return [line.strip() for line in manifest if line.strip() and not line.startswith("#")]
+
+
+def preflight(paths, max_workers=None, **options):
+    """
+    Check the local recordings at `paths` in a pool of `max_workers` processes, by default one
+    per CPU, and iterate over their `PreflightResult`s in the order in which they complete.
+    `options` are passed to `check_recording`. `paths` is consumed lazily.
+    """
+    check = functools.partial(check_recording, **options)
+    max_workers = max_workers or os.cpu_count() or 1
+    paths = iter(paths)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+        pending = set()
+
+        def fill():
+            for path in itertools.islice(paths, 2 * max_workers - len(pending)):
+                pending.add(executor.submit(check, path))
+
+        fill()
+        while pending:
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+            fill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("source", help="directory with recordings, or manifest file with one path per line")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes")
+    parser.add_argument("--min-duration", type=float, default=0.5, help="minimum duration in seconds")
+    parser.add_argument("--max-duration", type=float, default=None, help="maximum duration in seconds")
+    parser.add_argument("--silence-threshold", type=float, default=SILENCE_THRESHOLD_DBFS,
+                        help="RMS level in dBFS below which a recording is silent")
+    parser.add_argument("--accepted", help="write the paths of the accepted recordings to this manifest file")
+    args = parser.parse_args()
+
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO, format="%(asctime)s %(message)s")
+    results = sorted(preflight(list_recordings(args.source), args.workers, min_duration=args.min_duration,
+                               max_duration=args.max_duration, silence_threshold=args.silence_threshold),
+                     key=lambda result: result.path)
+    for result in results:
+        print(result)
+
+    accepted = [result.path for result in results if result.ok]
+    logging.info(f"{len(accepted)} of {len(results)} recordings accepted")
+    if args.accepted:
+        with open(args.accepted, "w", encoding="utf-8") as manifest:
+            manifest.writelines(f"{path}\n" for path in accepted)
+    sys.exit(0 if len(accepted) == len(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
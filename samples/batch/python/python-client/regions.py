@@ -0,0 +1,318 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+
+import collections
+import logging
+import threading
+import time
+import types
+import swagger_client as cris_client
+import urllib3
+from poller import COMPLETED_STATES
+
+# separates the transcription id from the name of the resource in qualified transcription ids
+RESOURCE_SEPARATOR = "@"
+
+# statuses after which a request is sent to another resource, 0 is a failed connection
+FAILOVER_STATUSES = (0, 408, 429, 500, 502, 503, 504)
+
+
+class RegionResource:
+    """
+    A speech resource in `region` with the key `subscription_key`, to which at most
+    `max_concurrent` requests are sent at a time. `name` identifies the resource in qualified
+    transcription ids and defaults to the region. Give resources in the same region different names.
+    """
+
+    def __init__(self, region, subscription_key, max_concurrent=8, name=None, host=None):
+        self.region = region
+        self.subscription_key = subscription_key
+        self.max_concurrent = max_concurrent
+        self.name = name or region
+        self.host = host or f"https://{region}.api.cognitive.microsoft.com/speechtotext/v3.0"
+        self.api = None
+
+        self.in_flight = 0
+        # ids of the transcriptions created on this resource that have not completed yet
+        self.open_jobs = set()
+        # exponentially weighted moving average of the request latency in seconds
+        self.latency = None
+        self.failures = 0
+        self.unhealthy_until = 0.0
+        self.stats = collections.Counter()
+
+    def __repr__(self):
+        return f"RegionResource({self.name}, in_flight={self.in_flight}, open_jobs={len(self.open_jobs)})"
+
+
+class RegionScheduler:
+    """
+    Distributes requests over several speech resources to scale beyond the limits of one resource.
+
+    New transcriptions are created on the healthy resource with a free request slot that has the
+    lowest expected delay, which is its latency average weighted by its number of open jobs and
+    requests in flight relative to its `max_concurrent` quota. A resource is considered degraded
+    for `cooldown` seconds after `failure_threshold` consecutive failed requests, and creating a
+    transcription fails over to the next best resource if a request fails with a transient error.
+    `api_factory(resource)` creates the API instance of a resource.
+    """
+
+    def __init__(self, resources, api_factory, smoothing=0.2, failure_threshold=3, cooldown=60.0,
+                 initial_latency=1.0):
+        self.resources = list(resources)
+        self._by_name = {resource.name: resource for resource in self.resources}
+        if len(self._by_name) != len(self.resources):
+            raise ValueError("the names of the resources are not unique")
+        for resource in self.resources:
+            resource.api = api_factory(resource)
+
+        self._smoothing = smoothing
+        self._failure_threshold = failure_threshold
+        self._cooldown = cooldown
+        self._initial_latency = initial_latency
+        self._condition = threading.Condition()
+
+    def resource(self, name):
+        return self._by_name[name]
+
+    def _expected_delay(self, resource):
+        latency = resource.latency if resource.latency is not None else self._initial_latency
+        return latency * (len(resource.open_jobs) + resource.in_flight + 1) / resource.max_concurrent
+
+    def _acquire(self, resource=None, exclude=()):
+        """
+        Take a request slot of `resource`, or of the best resource that is not in `exclude`, and
+        return the resource. Waits until a slot is free.
+        """
+        with self._condition:
+            while True:
+                if resource is not None:
+                    candidates = [resource]
+                else:
+                    candidates = [candidate for candidate in self.resources if candidate not in exclude]
+                    now = time.monotonic()
+                    healthy = [candidate for candidate in candidates if candidate.unhealthy_until <= now]
+                    # if all resources are degraded, use them anyway
+                    candidates = healthy or candidates
+                    if not candidates:
+                        raise ValueError("no resource left to send the request to")
+
+                available = [candidate for candidate in candidates if candidate.in_flight < candidate.max_concurrent]
+                if available:
+                    chosen = min(available, key=self._expected_delay)
+                    chosen.in_flight += 1
+                    return chosen
+                self._condition.wait()
+
+    def _release(self, resource, latency, failed):
+        with self._condition:
+            resource.in_flight -= 1
+            resource.stats["requests"] += 1
+            if resource.latency is None:
+                resource.latency = latency
+            else:
+                resource.latency += self._smoothing * (latency - resource.latency)
+
+            if failed:
+                resource.stats["failures"] += 1
+                resource.failures += 1
+                if resource.failures >= self._failure_threshold and resource.unhealthy_until <= time.monotonic():
+                    logging.warning(f"Resource {resource.name} is degraded, sending new transcriptions elsewhere "
+                                    f"for {self._cooldown} seconds")
+                    resource.unhealthy_until = time.monotonic() + self._cooldown
+            else:
+                resource.failures = 0
+            # waiters may wait for different resources
+            self._condition.notify_all()
+
+    def _invoke(self, resource, function):
+        # call `function(api)` for the request slot of `resource` that has been acquired
+        start = time.monotonic()
+        failed = True
+        try:
+            result = function(resource.api)
+            failed = False
+            return result
+        except cris_client.rest.ApiException as exc:
+            failed = exc.status in FAILOVER_STATUSES
+            raise
+        finally:
+            self._release(resource, time.monotonic() - start, failed)
+
+    def call(self, function, resource=None):
+        """
+        Call `function(api)` with the API of `resource`, or of the best resource if None, and
+        return the tuple `(resource, result)`.
+        """
+        resource = self._acquire(resource)
+        return resource, self._invoke(resource, function)
+
+    def create_transcription(self, transcription_definition):
+        """
+        Create a transcription from `transcription_definition` on the best resource, failing over
+        to the other resources on transient errors, and return the tuple
+        `(resource, (transcription, status, headers))`.
+        """
+        tried = []
+        while True:
+            resource = self._acquire(exclude=tried)
+            try:
+                response = self._invoke(
+                    resource, lambda api: api.create_transcription_with_http_info(transcription=transcription_definition))
+            except (cris_client.rest.ApiException, urllib3.exceptions.HTTPError) as exc:
+                tried.append(resource)
+                if getattr(exc, "status", 0) not in FAILOVER_STATUSES or len(tried) == len(self.resources):
+                    raise
+                logging.warning(f"Could not create transcription on {resource.name}, failing over: {exc}")
+                continue
+
+            with self._condition:
+                resource.open_jobs.add(response[2]["location"].split("/")[-1])
+            return resource, response
+
+    def complete(self, resource, transcription_id):
+        """
+        Record that the transcription `transcription_id` on `resource` has completed.
+        """
+        with self._condition:
+            resource.open_jobs.discard(transcription_id)
+
+
+def qualify(transcription_id, resource):
+    """
+    Return the id of the transcription `transcription_id` of `resource` that is unique across
+    all resources.
+    """
+    return f"{transcription_id}{RESOURCE_SEPARATOR}{resource.name}"
+
+
+def _qualify_self(item, resource):
+    # the id in the self link is used to identify transcriptions
+    if getattr(item, "_self", None):
+        item._self = qualify(item._self, resource)
+    return item
+
+
+def _qualify_next_link(page, resource):
+    # the next link is sent to the resource that returned the page, even if several resources
+    # share a host
+    if getattr(page, "next_link", None):
+        page.next_link = qualify(page.next_link, resource)
+    return page
+
+
+class _RoutingApiClient:
+    """
+    Stands in for the `ApiClient` of a `MultiRegionApi`. Requests for qualified absolute URLs of
+    the form `<url>@<resource name>`, such as the next links of paginated lists, are sent with the
+    API client of the named resource.
+    """
+
+    def __init__(self, scheduler):
+        self._scheduler = scheduler
+        self._api_client = scheduler.resources[0].api.api_client
+        # absolute links are passed to call_api unchanged
+        self.configuration = types.SimpleNamespace(host="")
+
+    def __getattr__(self, name):
+        return getattr(self._api_client, name)
+
+    @property
+    def rest_client(self):
+        # combined request statistics of all resources
+        stats = collections.Counter()
+        for resource in self._scheduler.resources:
+            stats.update(getattr(resource.api.api_client.rest_client, "stats", {}))
+        return types.SimpleNamespace(stats=stats)
+
+    def call_api(self, resource_path, method, *args, **kwargs):
+        url, _, name = resource_path.rpartition(RESOURCE_SEPARATOR)
+        try:
+            resource = self._scheduler.resource(name)
+        except KeyError:
+            raise ValueError(f"no resource for {resource_path}") from None
+        if not url.startswith(resource.host):
+            raise ValueError(f"{url} is not a url of resource {name}")
+        path = url[len(resource.host):]
+        _, response = self._scheduler.call(lambda api: api.api_client.call_api(path, method, *args, **kwargs),
+                                           resource)
+        if path.startswith("/transcriptions?"):
+            page = response[0]
+            for item in page.values or ():
+                _qualify_self(item, resource)
+            self.continue_listing(page, resource)
+        else:
+            _qualify_next_link(response[0], resource)
+        return response
+
+    def continue_listing(self, page, resource):
+        # the list of transcriptions continues with the transcriptions of the next resource
+        if page.next_link:
+            _qualify_next_link(page, resource)
+            return
+        index = self._scheduler.resources.index(resource) + 1
+        if index < len(self._scheduler.resources):
+            next_resource = self._scheduler.resources[index]
+            page.next_link = qualify(f"{next_resource.host}/transcriptions?skip=0", next_resource)
+
+
+class MultiRegionApi:
+    """
+    Drop-in replacement for the transcription api class of the generated client that distributes
+    the transcriptions over the resources of the `RegionScheduler` `scheduler`.
+
+    Transcriptions are identified by qualified ids of the form `<id>@<resource name>`, which are
+    used for all further requests of the transcription, so that they are sent to the resource
+    that created it. Listing all transcriptions returns the transcriptions of all resources.
+    """
+
+    def __init__(self, scheduler):
+        self._scheduler = scheduler
+        self.api_client = _RoutingApiClient(scheduler)
+
+    def _resolve(self, qualified_id):
+        transcription_id, _, name = qualified_id.rpartition(RESOURCE_SEPARATOR)
+        return self._scheduler.resource(name), transcription_id
+
+    def create_transcription_with_http_info(self, transcription, **kwargs):
+        resource, (data, status, headers) = self._scheduler.create_transcription(transcription)
+        # a copy of the case-insensitive headers
+        headers = headers.copy()
+        headers["location"] = qualify(headers["location"], resource)
+        return _qualify_self(data, resource), status, headers
+
+    def create_transcription(self, transcription, **kwargs):
+        return self.create_transcription_with_http_info(transcription, **kwargs)[0]
+
+    def get_transcription_with_http_info(self, id, **kwargs):
+        resource, transcription_id = self._resolve(id)
+        _, (data, status, headers) = self._scheduler.call(
+            lambda api: api.get_transcription_with_http_info(transcription_id, **kwargs), resource)
+        if data.status in COMPLETED_STATES:
+            self._scheduler.complete(resource, transcription_id)
+        return _qualify_self(data, resource), status, headers
+
+    def get_transcription(self, id, **kwargs):
+        return self.get_transcription_with_http_info(id, **kwargs)[0]
+
+    def get_transcription_files(self, id, **kwargs):
+        resource, transcription_id = self._resolve(id)
+        _, files = self._scheduler.call(lambda api: api.get_transcription_files(transcription_id, **kwargs), resource)
+        return _qualify_next_link(files, resource)
+
+    def delete_transcription(self, id, **kwargs):
+        resource, transcription_id = self._resolve(id)
+        self._scheduler.complete(resource, transcription_id)
+        _, result = self._scheduler.call(lambda api: api.delete_transcription(transcription_id, **kwargs), resource)
+        return result
+
+    def get_transcriptions(self, **kwargs):
+        resource = self._scheduler.resources[0]
+        _, page = self._scheduler.call(lambda api: api.get_transcriptions(**kwargs), resource)
+        for item in page.values or ():
+            _qualify_self(item, resource)
+        self.api_client.continue_listing(page, resource)
+        return page
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import urllib.parse
+import requests
+from result_parser import read_source
+
+
+def _strip_query(uri):
+    # SAS tokens differ between uploads and expire, so they are not part of the identity of a blob
+    return urllib.parse.urlsplit(uri)._replace(query="", fragment="").geturl()
+
+
+def blob_content_id(uri, session=None):
+    """
+    Return an identifier of the content of the blob at `uri`, or None if the blob has neither a
+    content MD5 nor an ETag. The content MD5 identifies the audio independent of its location,
+    while an ETag only identifies a version of the blob at its location.
+    """
+    session = session if session is not None else requests
+    response = session.head(uri, timeout=30)
+    response.raise_for_status()
+
+    content_md5 = response.headers.get("Content-MD5")
+    if content_md5:
+        return f"md5:{content_md5}"
+    etag = response.headers.get("ETag")
+    if etag:
+        return f"etag:{_strip_query(uri)}:{etag}"
+    return None
+
+
+def result_key(content_id, locale, model=None, properties=None):
+    """
+    Return the cache key of the transcription result of the audio `content_id` transcribed with
+    `locale`, `model` and `properties`.
+    """
+    settings = {"content": content_id, "locale": locale, "model": model, "properties": properties or {}}
+    return hashlib.sha256(json.dumps(settings, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Content-addressed cache of transcription results in `directory`.
+
+    Results are stored by their key from `result_key`. When the total size of the cached results
+    exceeds `max_bytes`, the least recently used results are evicted.
+    """
+
+    def __init__(self, directory, max_bytes=1 << 30):
+        self._directory = directory
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # uri without query -> key of recordings whose results are expected
+        self._expected = {}
+
+        os.makedirs(directory, exist_ok=True)
+        self._size = sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file())
+
+    def _path(self, key):
+        return os.path.join(self._directory, f"{key}.json")
+
+    def get(self, key, destination):
+        """
+        Copy the cached result for `key` to the file `destination` and return True, or return
+        False if the result is not cached.
+        """
+        path = self._path(key)
+        try:
+            shutil.copyfile(path, destination)
+        except FileNotFoundError:
+            return False
+
+        # mark the result as recently used
+        os.utime(path)
+        return True
+
+    def put(self, key, source_path):
+        """
+        Store a copy of the result file `source_path` under `key`.
+        """
+        path = self._path(key)
+        temporary_path = f"{path}.{threading.get_ident()}.tmp"
+        shutil.copyfile(source_path, temporary_path)
+        with self._lock:
+            if os.path.exists(path):
+                self._size -= os.path.getsize(path)
+            os.replace(temporary_path, path)
+            self._size += os.path.getsize(path)
+            if self._size > self._max_bytes:
+                self._evict()
+
+    def _evict(self):
+        entries = sorted((entry for entry in os.scandir(self._directory) if entry.name.endswith(".json")),
+                         key=lambda entry: entry.stat().st_mtime)
+        for entry in entries:
+            if self._size <= self._max_bytes * 0.9:
+                break
+            size = entry.stat().st_size
+            os.remove(entry.path)
+            self._size -= size
+            logging.debug(f"Evicted cached result {entry.name}")
+
+    def expect(self, uri, key):
+        """
+        Remember that the result of the recording at `uri` is to be stored under `key` once it
+        has been downloaded by `store_results`.
+        """
+        with self._lock:
+            self._expected[_strip_query(uri)] = key
+
+    def store_results(self, directory):
+        """
+        Store the downloaded result files in `directory` whose recordings were registered with
+        `expect`, and return the number of stored results.
+        """
+        stored = 0
+        for entry in os.scandir(directory):
+            if not entry.name.endswith(".json"):
+                continue
+            source = read_source(entry.path)
+            with self._lock:
+                key = self._expected.pop(_strip_query(source), None) if source else None
+            if key is not None:
+                self.put(key, entry.path)
+                stored += 1
+        return stored
@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+
+import codecs
+import json
+import re
+
+CHUNK_SIZE = 64 * 1024
+
+_TOKEN = re.compile(r'["{}\[\]]')
+# the characters of a string up to its closing quote, the end of the buffer, or a trailing backslash
+_STRING_BODY = re.compile(r'(?:[^"\\]|\\.)*', re.DOTALL)
+_WHITESPACE = re.compile(r"[\s,]*")
+_SOURCE = re.compile(rb'"source"\s*:\s*"([^"]*)"')
+
+
+class Phrase:
+    """
+    A recognized phrase with the properties of its best recognition. Offsets and durations are
+    in ticks of 100 nanoseconds.
+    """
+    __slots__ = ("index", "channel", "speaker", "offset", "duration", "status", "confidence",
+                 "lexical", "itn", "masked_itn", "display")
+
+    def __init__(self, index, channel, speaker, offset, duration, status, confidence, lexical, itn,
+                 masked_itn, display):
+        self.index = index
+        self.channel = channel
+        self.speaker = speaker
+        self.offset = offset
+        self.duration = duration
+        self.status = status
+        self.confidence = confidence
+        self.lexical = lexical
+        self.itn = itn
+        self.masked_itn = masked_itn
+        self.display = display
+
+    def __repr__(self):
+        return f"Phrase(index={self.index}, channel={self.channel}, offset={self.offset}, display={self.display!r})"
+
+
+class Word:
+    """
+    A recognized word of the best recognition of the phrase with index `phrase_index`. Offsets
+    and durations are in ticks of 100 nanoseconds.
+    """
+    __slots__ = ("phrase_index", "channel", "speaker", "offset", "duration", "confidence", "word")
+
+    def __init__(self, phrase_index, channel, speaker, offset, duration, confidence, word):
+        self.phrase_index = phrase_index
+        self.channel = channel
+        self.speaker = speaker
+        self.offset = offset
+        self.duration = duration
+        self.confidence = confidence
+        self.word = word
+
+    def __repr__(self):
+        return f"Word(phrase_index={self.phrase_index}, offset={self.offset}, word={self.word!r})"
+
+
+class _Reader:
+    """
+    Text buffer over an iterator of byte chunks, which is refilled on demand.
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.position = 0
+        self.eof = False
+
+    def fill(self):
+        """
+        Append the next chunk to the buffer, discarding the consumed part, and return False at
+        the end of the stream.
+        """
+        if self.eof:
+            return False
+        self.buffer = self.buffer[self.position:]
+        self.position = 0
+        try:
+            self.buffer += self._decoder.decode(next(self._chunks))
+        except StopIteration:
+            self.buffer += self._decoder.decode(b"", final=True)
+            self.eof = True
+        return True
+
+    def next_char(self):
+        """
+        Skip whitespace and commas and return the next character without consuming it, or None
+        at the end of the stream.
+        """
+        while True:
+            self.position = _WHITESPACE.match(self.buffer, self.position).end()
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self.fill():
+                return None
+
+
+def _seek_array(reader, key):
+    """
+    Advance `reader` to the first element of the array that is the value of the top-level
+    property `key`, and return False if there is no such property. Strings are skipped without
+    being held in memory, as some of them contain the text of the whole transcription.
+    """
+    depth = 0
+    in_string = False
+    # beginning of the current string, long enough to compare it with the key
+    string = ""
+    while True:
+        if in_string:
+            match = _STRING_BODY.match(reader.buffer, reader.position)
+            if len(string) <= len(key):
+                string += match.group()[:len(key) + 1]
+            if match.end() >= len(reader.buffer) - 1 and not reader.buffer.startswith('"', match.end()):
+                # the string continues in the next chunk
+                reader.position = match.end()
+                if not reader.fill():
+                    return False
+                continue
+
+            reader.position = match.end() + 1
+            in_string = False
+            if depth == 1 and string == key and reader.next_char() == ":":
+                reader.position += 1
+                if reader.next_char() == "[":
+                    reader.position += 1
+                    return True
+            continue
+
+        match = _TOKEN.search(reader.buffer, reader.position)
+        if match is None:
+            reader.position = len(reader.buffer)
+            if not reader.fill():
+                return False
+            continue
+
+        reader.position = match.end()
+        token = match.group()
+        if token == '"':
+            in_string = True
+            string = ""
+        elif token in "{[":
+            depth += 1
+        else:
+            depth -= 1
+
+
+def _iter_array(chunks, key):
+    """
+    Return a generator over the decoded elements of the array that is the value of the
+    top-level property `key` of the JSON document in the byte chunks `chunks`.
+    """
+    reader = _Reader(chunks)
+    if not _seek_array(reader, key):
+        return
+
+    decoder = json.JSONDecoder()
+    while True:
+        char = reader.next_char()
+        if char is None:
+            raise ValueError(f"unexpected end of stream in array {key}")
+        if char == "]":
+            return
+        try:
+            element, end = decoder.raw_decode(reader.buffer, reader.position)
+        except json.JSONDecodeError:
+            # the element is not complete yet
+            if not reader.fill():
+                raise
+            continue
+        reader.position = end
+        yield element
+
+
+def iter_phrases(chunks):
+    """
+    Return a generator over the recognized phrases in the result file read from the byte chunks
+    `chunks` as `Phrase` records.
+    """
+    for index, phrase in enumerate(_iter_array(chunks, "recognizedPhrases")):
+        best = phrase["nBest"][0] if phrase.get("nBest") else {}
+        yield Phrase(index, phrase.get("channel", 0), phrase.get("speaker"), int(phrase.get("offsetInTicks", 0)),
+                     int(phrase.get("durationInTicks", 0)), phrase.get("recognitionStatus"), best.get("confidence"),
+                     best.get("lexical"), best.get("itn"), best.get("maskedITN"), best.get("display"))
+
+
+def iter_words(chunks):
+    """
+    Return a generator over the words of the best recognition of all recognized phrases in the
+    result file read from the byte chunks `chunks` as `Word` records. Words are only contained
+    in result files of transcriptions with word level timestamps enabled.
+    """
+    for index, phrase in enumerate(_iter_array(chunks, "recognizedPhrases")):
+        if not phrase.get("nBest"):
+            continue
+        channel, speaker = phrase.get("channel", 0), phrase.get("speaker")
+        for word in phrase["nBest"][0].get("words", ()):
+            yield Word(index, channel, speaker, int(word.get("offsetInTicks", 0)), int(word.get("durationInTicks", 0)),
+                       word.get("confidence"), word.get("word"))
+
+
+def read_source(path):
+    """
+    Return the URI of the recording of the result file at `path`, or None if it is not found.
+    The source is one of the first properties of a result file, so the file is not parsed completely.
+    """
+    with open(path, "rb") as result_file:
+        match = _SOURCE.search(result_file.read(4096))
+    return match.group(1).decode("utf-8").replace("\\/", "/") if match else None
+
+
+def read_chunks(path, chunk_size=CHUNK_SIZE):
+    """
+    Return a generator over the chunks of the file at `path`.
+    """
+    with open(path, "rb") as result_file:
+        chunk = result_file.read(chunk_size)
+        while chunk:
+            yield chunk
+            chunk = result_file.read(chunk_size)
+
+
+def stream_chunks(url, session, chunk_size=CHUNK_SIZE):
+    """
+    Return a generator over the chunks of the result file at `url`, which is requested with the
+    `requests.Session` `session` without reading the whole response into memory.
+    """
+    with session.get(url, stream=True, timeout=60) as response:
+        response.raise_for_status()
+        yield from response.iter_content(chunk_size=chunk_size)
@@ -0,0 +1,280 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+
+import collections
+import logging
+import random
+import threading
+import time
+import urllib.parse
+import swagger_client as cris_client
+import urllib3
+from metrics import API_REQUEST_DURATION, API_RETRIES, endpoint
+from poller import parse_retry_after
+
+# statuses that indicate a transient condition of the service
+RETRYABLE_STATUSES = (408, 429, 500, 502, 503, 504)
+# statuses after which a request that is not idempotent has certainly not been processed
+RETRYABLE_UNSAFE_STATUSES = (429,)
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+
+
+class RetryPolicy:
+    """
+    Decides which failed requests are retried and how long to wait before each retry.
+
+    Requests are attempted at most `max_attempts` times. The delay before the n-th retry is drawn
+    from `[0, min(max_delay, base_delay * 2 ** n)]` (full jitter), unless the service asks for a
+    longer delay with a `Retry-After` header. Requests with a method that is not idempotent, such
+    as creating a transcription, are only retried after a status in `unsafe_statuses`, because
+    any other failure may have happened after the service processed them.
+    """
+
+    def __init__(self, max_attempts=5, base_delay=0.5, max_delay=30.0, statuses=RETRYABLE_STATUSES,
+                 unsafe_statuses=RETRYABLE_UNSAFE_STATUSES):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.statuses = statuses
+        self.unsafe_statuses = unsafe_statuses
+
+    def is_retryable(self, method, status):
+        """
+        Return whether a `method` request that failed with `status` can be retried. The status of
+        requests that failed without a response, such as on a connection error, is None or 0.
+        """
+        if method in IDEMPOTENT_METHODS:
+            return not status or status in self.statuses
+        return status in self.unsafe_statuses
+
+    def delay(self, retry, retry_after=None):
+        """
+        Return the number of seconds to wait before the retry number `retry`, starting at 0.
+        """
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** retry))
+        return max(delay, retry_after) if retry_after is not None else delay
+
+
+class RetryBudget:
+    """
+    Limits retries to a fraction of the requests, so that retries do not multiply the load on a
+    service that is already overloaded.
+
+    Every request deposits `ratio` tokens and every retry withdraws one token. `min_per_second`
+    tokens are added each second, so that a client that sends few requests can still retry.
+    At most `capacity` tokens are saved up.
+    """
+
+    def __init__(self, ratio=0.2, min_per_second=1.0, capacity=20.0):
+        self._ratio = ratio
+        self._min_per_second = min_per_second
+        self._capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, tokens):
+        now = time.monotonic()
+        tokens += (now - self._updated) * self._min_per_second
+        self._updated = now
+        self._tokens = min(self._capacity, self._tokens + tokens)
+
+    def deposit(self):
+        """
+        Record a request.
+        """
+        with self._lock:
+            self._refill(self._ratio)
+
+    def withdraw(self):
+        """
+        Take the token for a retry, and return False if the budget is exhausted.
+        """
+        with self._lock:
+            self._refill(0.0)
+            if self._tokens < 1.0:
+                return False
+            self._tokens -= 1.0
+            return True
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests to a host after `failure_threshold` consecutive failures.
+
+    While the circuit is open, requests fail immediately. After `reset_timeout` seconds it is
+    half-open and a single trial request is let through: the circuit closes again if the trial
+    succeeds, and opens for another `reset_timeout` seconds if it fails.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+
+    def retry_after(self):
+        """
+        Return the number of seconds until the circuit becomes half-open, or 0 if it is not open.
+        """
+        return max(0.0, self._opened_at + self._reset_timeout - time.monotonic()) if self.state == self.OPEN else 0.0
+
+    def allow(self):
+        """
+        Return whether a request may be sent now.
+        """
+        with self._lock:
+            if self.state == self.OPEN and self.retry_after() == 0.0:
+                self.state = self.HALF_OPEN
+                self._trial_running = False
+            if self.state == self.HALF_OPEN:
+                if self._trial_running:
+                    return False
+                self._trial_running = True
+            return self.state != self.OPEN
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self.state = self.CLOSED
+
+    def record_failure(self):
+        """
+        Record a failed request, and return True if the circuit has been opened by it.
+        """
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self._failures >= self._failure_threshold):
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                return True
+            return False
+
+
+class RetryingRestClient:
+    """
+    Transport wrapper for the `rest_client` of a generated `ApiClient` that retries transient
+    failures according to `policy` and `budget`, with a circuit breaker per host.
+
+    Use `install_retries` to add it to an `ApiClient`. The wrapper raises the same
+    `ApiException` as the wrapped client once a request is not retried any further, and also
+    when a request is rejected by an open circuit. The counters in `stats` record requests,
+    attempts, retries, exhausted retries and budget, rejected requests, and opened circuits.
+    """
+
+    def __init__(self, rest_client, policy=None, budget=None, breaker_factory=CircuitBreaker):
+        self._rest_client = rest_client
+        self._policy = policy if policy is not None else RetryPolicy()
+        self._budget = budget if budget is not None else RetryBudget()
+        self._breaker_factory = breaker_factory
+        self._breakers = {}
+        self._lock = threading.Lock()
+        self.stats = collections.Counter()
+
+    def __getattr__(self, name):
+        return getattr(self._rest_client, name)
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def breaker(self, host):
+        """
+        Return the circuit breaker of `host`.
+        """
+        with self._lock:
+            if host not in self._breakers:
+                self._breakers[host] = self._breaker_factory()
+            return self._breakers[host]
+
+    def request(self, method, url, *args, **kwargs):
+        breaker = self.breaker(urllib.parse.urlsplit(url).netloc)
+        path = endpoint(url)
+        self._count("requests")
+        self._budget.deposit()
+
+        retry = 0
+        while True:
+            if not breaker.allow():
+                self._count("rejected")
+                exception = cris_client.rest.ApiException(status=503, reason="circuit breaker is open")
+                exception.headers = {"Retry-After": str(breaker.retry_after())}
+                raise exception
+
+            self._count("attempts")
+            start = time.monotonic()
+            try:
+                response = self._rest_client.request(method, url, *args, **kwargs)
+            except (cris_client.rest.ApiException, urllib3.exceptions.HTTPError) as exc:
+                status = getattr(exc, "status", None)
+                API_REQUEST_DURATION.observe(time.monotonic() - start, method=method, endpoint=path, status=status or 0)
+                # throttling is handled by Retry-After, and other client errors are not a sign of an
+                # unhealthy service
+                if status != 429 and (not status or status in self._policy.statuses):
+                    if breaker.record_failure():
+                        self._count("circuits_opened")
+                        logging.warning(f"Circuit breaker opened for {urllib.parse.urlsplit(url).netloc}")
+                else:
+                    breaker.record_success()
+
+                if not self._policy.is_retryable(method, status):
+                    raise
+                if retry + 1 >= self._policy.max_attempts:
+                    self._count("retries_exhausted")
+                    raise
+                if not self._budget.withdraw():
+                    self._count("budget_exhausted")
+                    raise
+
+                delay = self._policy.delay(retry, parse_retry_after(getattr(exc, "headers", None)))
+                logging.debug(f"Retrying {method} {url.split('?')[0]} in {delay:.2f} s after {exc!r}")
+                self._count("retries")
+                API_RETRIES.inc(method=method, endpoint=path)
+                retry += 1
+                time.sleep(delay)
+                continue
+
+            API_REQUEST_DURATION.observe(time.monotonic() - start, method=method, endpoint=path,
+                                         status=getattr(response, "status", 0))
+            breaker.record_success()
+            return response
+
+    def GET(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def HEAD(self, url, **kwargs):
+        return self.request("HEAD", url, **kwargs)
+
+    def OPTIONS(self, url, **kwargs):
+        return self.request("OPTIONS", url, **kwargs)
+
+    def DELETE(self, url, **kwargs):
+        return self.request("DELETE", url, **kwargs)
+
+    def POST(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def PUT(self, url, **kwargs):
+        return self.request("PUT", url, **kwargs)
+
+    def PATCH(self, url, **kwargs):
+        return self.request("PATCH", url, **kwargs)
+
+
+def install_retries(api_client, policy=None, budget=None, breaker_factory=CircuitBreaker):
+    """
+    Wrap the `rest_client` of the generated `ApiClient` `api_client` in a `RetryingRestClient`,
+    and return the wrapper.
+    """
+    api_client.rest_client = RetryingRestClient(api_client.rest_client, policy, budget, breaker_factory)
+    return api_client.rest_client
@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+
+import collections
+import socket
+import threading
+import time
+import certifi
+import requests
+import swagger_client as cris_client
+import urllib3
+
+try:
+    import httpx
+except ImportError:
+    # only required for the HTTP/2 transport
+    httpx = None
+
+# send TCP keep-alive probes on idle connections, so that pooled connections are not dropped
+# silently by load balancers and NAT gateways, which close idle connections after a few minutes
+KEEPALIVE_SOCKET_OPTIONS = [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)] + [
+    (socket.IPPROTO_TCP, getattr(socket, name), value)
+    for name, value in (("TCP_KEEPIDLE", 60), ("TCP_KEEPINTVL", 15), ("TCP_KEEPCNT", 4))
+    if hasattr(socket, name)
+]
+
+
+def create_pool_manager(pool_size, num_pools=16, block=False, ca_certs=None, dns_cache=None):
+    """
+    Create a `urllib3.PoolManager` that keeps up to `pool_size` connections alive to each of up to
+    `num_pools` hosts, with TCP keep-alive enabled. If `block` is True, requests wait for a free
+    connection instead of opening connections beyond `pool_size` that are closed after use.
+    Server certificates are verified with the CA bundle `ca_certs`, by default the one of `certifi`.
+    If `dns_cache` is given, new connections of the pool manager look up host names with this
+    `DnsCache`.
+
+    The certificate settings match those of `requests`, so that the generated API client and a
+    `requests.Session` sharing the pool manager also share the connections to a host. Pass the
+    same CA bundle as `verify` to the requests of the session if you change it.
+    """
+    pool_manager = urllib3.PoolManager(
+        num_pools=num_pools, maxsize=pool_size, block=block, cert_reqs="CERT_REQUIRED",
+        ca_certs=ca_certs or certifi.where(),
+        socket_options=urllib3.connection.HTTPConnection.default_socket_options + KEEPALIVE_SOCKET_OPTIONS)
+    if dns_cache is not None:
+        pool_manager.pool_classes_by_scheme = _cached_dns_pool_classes(dns_cache)
+    return pool_manager
+
+
+def share_pool_manager(pool_manager, api_client=None, session=None):
+    """
+    Let the generated `ApiClient` `api_client` and the `requests.Session` `session` send their
+    requests over the connections of `pool_manager`. Share the pool manager before other
+    wrappers, such as the one of `retry.install_retries`, are installed on the API client.
+    """
+    if api_client is not None:
+        api_client.rest_client.pool_manager = pool_manager
+    if session is not None:
+        adapter = requests.adapters.HTTPAdapter()
+        adapter.poolmanager = pool_manager
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+
+class DnsCache:
+    """
+    Cache of host name lookups for the connections of pool managers created by
+    `create_pool_manager`, which keeps the addresses of a host for `ttl` seconds. New connections
+    to the same hosts then do not wait for a DNS lookup, while lookups of other libraries are not
+    affected. At most `max_entries` hosts are cached, the least recently used are dropped first.
+    Failed lookups are not cached.
+    """
+
+    def __init__(self, ttl=300.0, max_entries=256):
+        self._ttl = ttl
+        self._max_entries = max_entries
+        # (host, port) -> (expiry time, addresses), the least recently used first
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def resolve(self, host, port):
+        """
+        Return the list of IP addresses of `host` for connections to `port`.
+        """
+        key = (host, port)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        family = urllib3.util.connection.allowed_gai_family()
+        # unique addresses in the order of preference
+        addresses = list(dict.fromkeys(
+            info[4][0] for info in socket.getaddrinfo(host, port, family, socket.SOCK_STREAM)))
+        with self._lock:
+            self._entries[key] = (now + self._ttl, addresses)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+        return addresses
+
+
+class _CachedDnsConnectionMixin:
+    # set on the connection classes created by `_cached_dns_pool_classes`
+    dns_cache = None
+
+    def _new_conn(self):
+        host = self._dns_host
+        try:
+            addresses = self.dns_cache.resolve(host, self.port)
+        except OSError:
+            # let urllib3 look up the host again and report the error
+            return super()._new_conn()
+
+        error = None
+        for address in addresses:
+            # connect to the cached address, the certificate is still verified for the host name
+            self._dns_host = address
+            try:
+                return super()._new_conn()
+            except (urllib3.exceptions.NewConnectionError, urllib3.exceptions.ConnectTimeoutError) as exc:
+                error = exc
+            finally:
+                self._dns_host = host
+        raise error
+
+
+def _cached_dns_pool_classes(dns_cache):
+    # connection pool classes by scheme whose connections look up host names with `dns_cache`
+    pool_classes = {}
+    for scheme, pool_class in (("http", urllib3.HTTPConnectionPool), ("https", urllib3.HTTPSConnectionPool)):
+        connection_class = type(f"CachedDns{pool_class.ConnectionCls.__name__}",
+                                (_CachedDnsConnectionMixin, pool_class.ConnectionCls), {"dns_cache": dns_cache})
+        pool_classes[scheme] = type(f"CachedDns{pool_class.__name__}", (pool_class,),
+                                    {"ConnectionCls": connection_class})
+    return pool_classes
+
+
+class _Http2Response:
+    """
+    Response of `Http2RestClient` with the interface of the responses of the generated REST client.
+    """
+
+    def __init__(self, response):
+        self.status = response.status_code
+        self.reason = response.reason_phrase
+        self.data = response.content
+        self._headers = response.headers
+
+    def getheaders(self):
+        return self._headers
+
+    def getheader(self, name, default=None):
+        return self._headers.get(name, default)
+
+
+class Http2RestClient:
+    """
+    Replacement for the `rest_client` of a generated `ApiClient` that sends requests with `httpx`
+    over HTTP/2, if the server supports it. HTTP/2 multiplexes all concurrent requests to a host
+    over a single connection, so only one TLS handshake is needed. Requires `pip install httpx[http2]`.
+
+        api_client.rest_client = Http2RestClient(configuration)
+    """
+
+    def __init__(self, configuration, max_connections=100, timeout=60.0):
+        if httpx is None:
+            raise RuntimeError("httpx is required for the HTTP/2 transport, install it with `pip install httpx[http2]`")
+        verify = (configuration.ssl_ca_cert or certifi.where()) if configuration.verify_ssl else False
+        self._client = httpx.Client(
+            http2=True, verify=verify, timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections))
+
+    def close(self):
+        self._client.close()
+
+    def request(self, method, url, query_params=None, headers=None, body=None, post_params=None,
+                _preload_content=True, _request_timeout=None):
+        headers = dict(headers or {})
+        headers.setdefault("Content-Type", "application/json")
+        timeout = _request_timeout if _request_timeout is not None else httpx.USE_CLIENT_DEFAULT
+        try:
+            response = self._client.request(method, url, params=query_params, headers=headers, timeout=timeout,
+                                            json=body, data=dict(post_params) if post_params else None)
+        except httpx.TransportError as exc:
+            # like the generated REST client on connection errors
+            raise cris_client.rest.ApiException(status=0, reason=f"{type(exc).__name__}: {exc}")
+
+        response = _Http2Response(response)
+        if not 200 <= response.status <= 299:
+            raise cris_client.rest.ApiException(http_resp=response)
+        return response
+
+    def GET(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def HEAD(self, url, **kwargs):
+        return self.request("HEAD", url, **kwargs)
+
+    def OPTIONS(self, url, **kwargs):
+        return self.request("OPTIONS", url, **kwargs)
+
+    def DELETE(self, url, **kwargs):
+        return self.request("DELETE", url, **kwargs)
+
+    def POST(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def PUT(self, url, **kwargs):
+        return self.request("PUT", url, **kwargs)
+
+    def PATCH(self, url, **kwargs):
+        return self.request("PATCH", url, **kwargs)
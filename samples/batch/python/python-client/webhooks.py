@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+
+import base64
+import collections
+import hashlib
+import hmac
+import http.server
+import json
+import logging
+import threading
+import urllib.parse
+import swagger_client as cris_client
+
+EVENT_HEADER = "X-MicrosoftSpeechServices-Event"
+SIGNATURE_HEADER = "X-MicrosoftSpeechServices-Signature"
+TRANSCRIPTION_COMPLETION = "TranscriptionCompletion"
+
+
+def signature(secret, body):
+    """
+    Return the signature of the notification body `body` with `secret`, as sent by the service in
+    the `X-MicrosoftSpeechServices-Signature` header: the base64 encoded HMAC-SHA256 of the body.
+    """
+    return base64.b64encode(hmac.new(secret.encode("utf-8"), body, hashlib.sha256).digest()).decode("ascii")
+
+
+class _NotificationHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _respond(self, status, body=b""):
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _validate(self):
+        # the service checks that it may send notifications to the url by expecting the
+        # validation token back in the response body
+        token = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query).get("validationToken")
+        if token is None:
+            return False
+        self.server.receiver.count("validations")
+        self._respond(200, token[0].encode("utf-8"))
+        return True
+
+    def do_GET(self):
+        if not self._validate():
+            self._respond(404)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self._validate():
+            return
+        self._respond(200 if self.server.receiver.handle(self.headers, body) else 401)
+
+
+class WebhookReceiver:
+    """
+    Embedded HTTP server that receives the web hook notifications of the speech service.
+
+    The receiver answers the validation requests of the service, checks the signature of each
+    notification with `secret`, and calls `on_event(event, transcription_id)` for every
+    notification about a transcription. `on_event` is called from the threads of the server and
+    should return quickly. The counters in `stats` record validations, events, and rejected
+    notifications.
+    """
+
+    def __init__(self, on_event, secret=None, host="0.0.0.0", port=8080):
+        self._on_event = on_event
+        self._secret = secret
+        self._server = http.server.ThreadingHTTPServer((host, port), _NotificationHandler)
+        self._server.daemon_threads = True
+        self._server.receiver = self
+        self.port = self._server.server_port
+        self.stats = collections.Counter()
+        self._lock = threading.Lock()
+
+    def count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def shutdown(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def handle(self, headers, body):
+        """
+        Handle the notification with `headers` and `body`, and return False if it is rejected.
+        """
+        if self._secret is not None:
+            expected = signature(self._secret, body)
+            if not hmac.compare_digest(headers.get(SIGNATURE_HEADER, ""), expected):
+                logging.warning("Rejected web hook notification with an invalid signature")
+                self.count("rejected")
+                return False
+
+        try:
+            transcription_id = json.loads(body)["self"].split("/")[-1]
+        except (ValueError, KeyError, AttributeError):
+            self.count("rejected")
+            return False
+
+        event = headers.get(EVENT_HEADER)
+        self.count("events")
+        logging.debug(f"Received web hook event {event} for transcription {transcription_id}")
+        self._on_event(event, transcription_id)
+        return True
+
+
+def register_hook(api, web_url, secret, display_name="Batch transcription client"):
+    """
+    Register a web hook of the speech resource of `api` that sends a notification to `web_url`
+    when a transcription has completed, signed with `secret`, and return the id of the web hook.
+    """
+    web_hook = cris_client.WebHook(
+        display_name=display_name, web_url=web_url,
+        events=cris_client.WebHookEvents(transcription_completion=True),
+        properties=cris_client.WebHookProperties(secret=secret))
+    _, _, headers = api.create_hook_with_http_info(web_hook)
+    return headers["location"].split("/")[-1]
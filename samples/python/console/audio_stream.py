@@ -0,0 +1,485 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+"""
+Audio input streams for speech recognition from WAV files
+"""
+
+import mmap
+import struct
+import threading
+import time
+
+try:
+    import azure.cognitiveservices.speech as speechsdk
+except ImportError:
+    print("""
+    Importing the Speech SDK for Python failed.
+    Refer to
+    https://docs.microsoft.com/azure/cognitive-services/speech-service/quickstart-python for
+    installation instructions.
+    """)
+    import sys
+    sys.exit(1)
+
+try:
+    import numpy as np
+except ImportError:
+    # only required for converting audio to the format of the recognizer
+    np = None
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# number of bytes after which pages of the mapped file that have been read are released
+RELEASE_INTERVAL = 16 * 1024 * 1024
+
+# format of the audio that is passed to the recognizer
+TARGET_SAMPLE_RATE = 16000
+TARGET_BITS_PER_SAMPLE = 16
+# number of sample frames of the file that are converted at a time
+CONVERSION_BLOCK_FRAMES = 8192
+# number of coefficients of the low-pass filter applied before downsampling
+LOWPASS_TAPS = 63
+
+
+class WavFormat(object):
+    """format and location of the audio data of a RIFF/WAVE file"""
+
+    def __init__(self, format_tag, channels, sample_rate, bits_per_sample, block_align, data_offset, data_size):
+        self.format_tag = format_tag
+        self.channels = channels
+        self.sample_rate = sample_rate
+        self.bits_per_sample = bits_per_sample
+        self.block_align = block_align
+        self.data_offset = data_offset
+        self.data_size = data_size
+
+    @property
+    def frames(self):
+        """number of sample frames, one sample per channel each"""
+        return self.data_size // self.block_align
+
+    @property
+    def duration(self):
+        """duration of the audio data in seconds"""
+        return self.frames / self.sample_rate
+
+    def __repr__(self):
+        return 'WavFormat(format_tag={:#06x}, channels={}, sample_rate={}, bits_per_sample={}, duration={:.2f}s)'.format(
+            self.format_tag, self.channels, self.sample_rate, self.bits_per_sample, self.duration)
+
+
+def parse_riff_header(buffer):
+    """parses the RIFF/WAVE header at the start of `buffer`, a bytes-like object with the whole
+    file such as an mmap, and returns a `WavFormat`. Chunks other than the format and data chunks
+    are skipped. For WAVE_FORMAT_EXTENSIBLE files, the format tag is taken from the sub format.
+    Raises a ValueError if the buffer does not contain a valid WAV file."""
+    size = len(buffer)
+    if size < 12 or buffer[0:4] != b'RIFF' or buffer[8:12] != b'WAVE':
+        raise ValueError('not a RIFF/WAVE file')
+
+    fmt = None
+    position = 12
+    while position + 8 <= size:
+        chunk_id = bytes(buffer[position:position + 4])
+        chunk_size, = struct.unpack_from('<I', buffer, position + 4)
+        body = position + 8
+        if chunk_id == b'fmt ':
+            if chunk_size < 16 or body + chunk_size > size:
+                raise ValueError('invalid fmt chunk')
+            format_tag, channels, sample_rate, _, block_align, bits_per_sample = struct.unpack_from('<HHIIHH', buffer, body)
+            if format_tag == WAVE_FORMAT_EXTENSIBLE:
+                if chunk_size < 40:
+                    raise ValueError('invalid extensible fmt chunk')
+                # the first two bytes of the sub format GUID are the actual format tag
+                format_tag, = struct.unpack_from('<H', buffer, body + 24)
+            if channels == 0 or block_align == 0 or sample_rate == 0:
+                raise ValueError('invalid format: {} channels, block alignment {}, sample rate {}'.format(
+                    channels, block_align, sample_rate))
+            fmt = (format_tag, channels, sample_rate, bits_per_sample, block_align)
+        elif chunk_id == b'data':
+            if fmt is None:
+                raise ValueError('data chunk before fmt chunk')
+            # streamed files may not set the size, and truncated files have less data than declared
+            if chunk_size in (0, 0xFFFFFFFF) or body + chunk_size > size:
+                chunk_size = size - body
+            # only whole sample frames are read
+            chunk_size -= chunk_size % fmt[4]
+            return WavFormat(*fmt, data_offset=body, data_size=chunk_size)
+        # chunks are padded to an even size
+        position = body + chunk_size + (chunk_size & 1)
+
+    raise ValueError('no data chunk found')
+
+
+def _map_wav_file(filename: str):
+    """opens and memory-maps the WAV file `filename` and parses its header, returns the tuple
+    `(file, mmap, WavFormat)`. Raises a ValueError for empty and invalid files, whose file is
+    closed."""
+    file_h = open(filename, 'rb')
+    try:
+        buffer = mmap.mmap(file_h.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError as ex:
+        # empty files cannot be mapped
+        file_h.close()
+        raise ValueError('{} is an empty or invalid WAV file: {}'.format(filename, ex)) from ex
+    except BaseException:
+        file_h.close()
+        raise
+    try:
+        return file_h, buffer, parse_riff_header(buffer)
+    except ValueError as ex:
+        buffer.close()
+        file_h.close()
+        raise ValueError('{} is an empty or invalid WAV file: {}'.format(filename, ex)) from ex
+
+
+class _MappedWavCallback(speechsdk.audio.PullAudioInputStreamCallback):
+    """base class of pull audio stream callbacks that read a memory-mapped WAV file. `mapped` is
+    the result of `_map_wav_file` for the file, if it has been mapped already."""
+
+    def __init__(self, filename: str, mapped=None):
+        super().__init__()
+        self._file_h, self._mmap, self.format = mapped if mapped is not None else _map_wav_file(filename)
+        try:
+            self._check_format(self.format)
+        except ValueError:
+            self._mmap.close()
+            self._file_h.close()
+            raise
+        if hasattr(self._mmap, 'madvise'):
+            self._mmap.madvise(mmap.MADV_SEQUENTIAL)
+        self._view = memoryview(self._mmap)
+        self._position = self.format.data_offset
+        self._end = self.format.data_offset + self.format.data_size
+        self._released = 0
+
+    def _check_format(self, wav_format):
+        pass
+
+    def _release_read_pages(self):
+        if self._position - self._released >= RELEASE_INTERVAL and hasattr(mmap, 'MADV_DONTNEED'):
+            # the range must start at a page boundary
+            release_end = self._position - self._position % mmap.PAGESIZE
+            self._mmap.madvise(mmap.MADV_DONTNEED, self._released, release_end - self._released)
+            self._released = release_end
+
+    def close(self):
+        """close callback function"""
+        if self._view is not None:
+            # the mmap cannot be closed while a view of it exists
+            self._view.release()
+            self._view = None
+            self._mmap.close()
+            self._file_h.close()
+
+
+class MmapWavReaderCallback(_MappedWavCallback):
+    """pull audio stream callback that reads the audio data of a WAV file by memory-mapping it.
+
+    The header is parsed once, and each read copies the next bytes of audio directly from the
+    mapped file into the buffer of the SDK, without intermediate objects. Memory use does not
+    depend on the length of the file: where supported, the operating system is told that the file
+    is read sequentially, and pages that have been read are released every `RELEASE_INTERVAL`
+    bytes. The recognizer expects 16 kHz 16 bit mono PCM audio, use `open_wav_callback` for
+    files in other formats."""
+
+    def _check_format(self, wav_format):
+        if (wav_format.format_tag, wav_format.channels, wav_format.bits_per_sample, wav_format.sample_rate) != \
+                (WAVE_FORMAT_PCM, 1, TARGET_BITS_PER_SAMPLE, TARGET_SAMPLE_RATE):
+            raise ValueError('unsupported format {}, 16 kHz 16 bit mono PCM is required'.format(wav_format))
+
+    def stream_format(self):
+        """returns the `AudioStreamFormat` of the audio data"""
+        return speechsdk.audio.AudioStreamFormat(samples_per_second=self.format.sample_rate,
+                                                 bits_per_sample=self.format.bits_per_sample,
+                                                 channels=self.format.channels)
+
+    def read(self, buffer: memoryview) -> int:
+        """read callback function"""
+        size = min(buffer.nbytes, self._end - self._position)
+        # slicing a memoryview does not copy, the assignment copies once into the SDK buffer
+        buffer[:size] = self._view[self._position:self._position + size]
+        self._position += size
+        self._release_read_pages()
+        return size
+
+
+class _Resampler(object):
+    """streaming sample rate converter with linear interpolation, preceded by a windowed sinc
+    low-pass filter when downsampling to avoid aliasing"""
+
+    def __init__(self, input_rate, output_rate, taps=LOWPASS_TAPS):
+        self._step = input_rate / output_rate
+        self._filter = None
+        if input_rate > output_rate:
+            # cutoff a bit below the output Nyquist frequency, in cycles per input sample
+            cutoff = 0.45 * output_rate / input_rate
+            n = np.arange(taps) - (taps - 1) / 2
+            coefficients = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hamming(taps)
+            self._filter = (coefficients / coefficients.sum()).astype(np.float32)
+            self._history = np.zeros(taps - 1, dtype=np.float32)
+        # input samples that have not been used completely, and the position of the next output
+        # sample relative to them
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._offset = 0.
+
+    def process(self, samples):
+        if self._filter is not None:
+            extended = np.concatenate((self._history, samples))
+            self._history = extended[len(extended) - len(self._history):]
+            samples = np.convolve(extended, self._filter, mode='valid').astype(np.float32)
+
+        pending = np.concatenate((self._pending, samples))
+        # output samples are interpolated between pending[i] and pending[i + 1]
+        count = max(0, int(np.ceil((len(pending) - 1 - self._offset) / self._step)))
+        positions = self._offset + np.arange(count) * self._step
+        indices = positions.astype(np.intp)
+        fractions = (positions - indices).astype(np.float32)
+        output = pending[indices] * (1 - fractions) + pending[np.minimum(indices + 1, len(pending) - 1)] * fractions
+
+        next_position = self._offset + count * self._step
+        consumed = min(int(next_position), len(pending))
+        self._pending = pending[consumed:]
+        self._offset = next_position - consumed
+        return output
+
+
+class ConvertingWavReaderCallback(_MappedWavCallback):
+    """pull audio stream callback that converts a memory-mapped WAV file of any PCM format to the
+    16 kHz 16 bit mono PCM format of the recognizer while reading.
+
+    Integer samples of 8, 16, 24 or 32 bits and floating point samples are supported with any
+    number of channels and sample rates from 8 to 48 kHz, also in WAVE_FORMAT_EXTENSIBLE files.
+    The audio is converted with NumPy in blocks of `CONVERSION_BLOCK_FRAMES` frames: the channels
+    are mixed down to mono, and the sample rate is converted to 16 kHz. Requires
+    `pip install numpy`."""
+
+    def __init__(self, filename: str, mapped=None):
+        if np is None:
+            raise RuntimeError('numpy is required for converting audio, install it with `pip install numpy`')
+        super().__init__(filename, mapped)
+        self._resampler = _Resampler(self.format.sample_rate, TARGET_SAMPLE_RATE) \
+            if self.format.sample_rate != TARGET_SAMPLE_RATE else None
+        self._output = bytearray()
+
+    def _check_format(self, wav_format):
+        if wav_format.format_tag == WAVE_FORMAT_IEEE_FLOAT:
+            supported = wav_format.bits_per_sample in (32, 64)
+        else:
+            supported = wav_format.format_tag == WAVE_FORMAT_PCM and wav_format.bits_per_sample in (8, 16, 24, 32)
+        if not supported or wav_format.block_align != wav_format.channels * wav_format.bits_per_sample // 8:
+            raise ValueError('unsupported format {}'.format(wav_format))
+        if not 8000 <= wav_format.sample_rate <= 48000:
+            raise ValueError('unsupported sample rate {} Hz'.format(wav_format.sample_rate))
+
+    def stream_format(self):
+        """returns the `AudioStreamFormat` of the converted audio"""
+        return speechsdk.audio.AudioStreamFormat(samples_per_second=TARGET_SAMPLE_RATE,
+                                                 bits_per_sample=TARGET_BITS_PER_SAMPLE, channels=1)
+
+    def _decode(self, start, frames):
+        # returns the samples of `frames` frames at byte offset `start` as float32 in [-1, 1],
+        # with one row per frame and one column per channel
+        wav_format = self.format
+        count = frames * wav_format.channels
+        bits = wav_format.bits_per_sample
+        if wav_format.format_tag == WAVE_FORMAT_IEEE_FLOAT:
+            samples = np.frombuffer(self._view, '<f4' if bits == 32 else '<f8', count, start).astype(np.float32)
+        elif bits == 8:
+            # 8 bit samples are unsigned
+            samples = (np.frombuffer(self._view, np.uint8, count, start).astype(np.float32) - 128) / 128
+        elif bits == 24:
+            data = np.frombuffer(self._view, np.uint8, count * 3, start).reshape(-1, 3).astype(np.int32)
+            # little-endian 24 bit integers, sign extended by the arithmetic shift
+            samples = ((data[:, 0] << 8 | data[:, 1] << 16 | data[:, 2] << 24) >> 8).astype(np.float32) / (1 << 23)
+        else:
+            samples = np.frombuffer(self._view, '<i2' if bits == 16 else '<i4', count, start).astype(np.float32) \
+                / (1 << (bits - 1))
+        return samples.reshape(frames, wav_format.channels)
+
+    def _convert_block(self):
+        frames = min(CONVERSION_BLOCK_FRAMES, (self._end - self._position) // self.format.block_align)
+        samples = self._decode(self._position, frames)
+        self._position += frames * self.format.block_align
+        self._release_read_pages()
+
+        mono = samples[:, 0] if self.format.channels == 1 else samples.mean(axis=1)
+        if self._resampler is not None:
+            mono = self._resampler.process(mono)
+        pcm = (np.clip(mono, -1, 1) * 32767).astype('<i2')
+        self._output += pcm.tobytes()
+
+    def read(self, buffer: memoryview) -> int:
+        """read callback function"""
+        while len(self._output) < buffer.nbytes and self._position < self._end:
+            self._convert_block()
+        size = min(buffer.nbytes, len(self._output))
+        buffer[:size] = self._output[:size]
+        del self._output[:size]
+        return size
+
+
+def open_wav_callback(filename: str):
+    """returns a pull audio stream callback for the WAV file `filename`, which reads 16 kHz 16 bit
+    mono PCM files directly and converts files in other formats"""
+    # the file is mapped and its header parsed once, for choosing the callback and by the callback
+    file_h, buffer, wav_format = mapped = _map_wav_file(filename)
+    try:
+        if (wav_format.format_tag, wav_format.channels, wav_format.bits_per_sample, wav_format.sample_rate) == \
+                (WAVE_FORMAT_PCM, 1, TARGET_BITS_PER_SAMPLE, TARGET_SAMPLE_RATE):
+            return MmapWavReaderCallback(filename, mapped)
+        return ConvertingWavReaderCallback(filename, mapped)
+    except BaseException:
+        buffer.close()
+        file_h.close()
+        raise
+
+
+class FeedStatistics(object):
+    """statistics of feeding audio into a push stream"""
+
+    def __init__(self):
+        self.bytes = 0
+        self.audio_seconds = 0.
+        self.wall_seconds = 0.
+        # seconds by which writes were late relative to the pacing schedule
+        self.max_drift = 0.
+        self.total_drift = 0.
+        self.writes = 0
+        # seconds spent waiting for the recognizer to catch up
+        self.backpressure_seconds = 0.
+
+    @property
+    def mean_drift(self):
+        return self.total_drift / self.writes if self.writes else 0.
+
+    @property
+    def speed(self):
+        """seconds of audio fed per second of wall clock time"""
+        return self.audio_seconds / self.wall_seconds if self.wall_seconds else 0.
+
+    def __str__(self):
+        return ('fed {:.1f}s of audio ({} bytes) in {:.1f}s, {:.1f}x real time, drift mean {:.1f}ms max {:.1f}ms, '
+                'waited {:.1f}s for the recognizer').format(
+            self.audio_seconds, self.bytes, self.wall_seconds, self.speed, 1000 * self.mean_drift,
+            1000 * self.max_drift, self.backpressure_seconds)
+
+
+class PushStreamFeeder(object):
+    """writes audio into a push audio stream with selectable pacing.
+
+    With `speed` 1, the audio is written in real time as it would arrive from a live source, with
+    `speed` N, N times faster, and with `speed` None as fast as the recognizer processes it. The
+    write times follow a schedule derived from the sample rate, so sleeping does not accumulate
+    drift, and the lateness of each write relative to the schedule is reported as drift.
+
+    If `max_lead` is set, writing pauses while the audio written is more than `max_lead` seconds
+    ahead of the audio the recognizer has processed. The push stream does not limit how much
+    audio is buffered, so this is the backpressure for unthrottled feeding. Call `attach` with the
+    recognizer to track its progress. The recognizer sends no results for silence, so between
+    results it is assumed to process the audio in real time. Feeding stops when the recognition
+    is canceled or stopped."""
+
+    def __init__(self, stream, speed=1., chunk_seconds=.1, bytes_per_second=TARGET_SAMPLE_RATE * 2, max_lead=None):
+        self._stream = stream
+        self._speed = speed
+        self._bytes_per_second = bytes_per_second
+        self._chunk_bytes = int(chunk_seconds * bytes_per_second)
+        self._chunk_bytes -= self._chunk_bytes % 2
+        self._max_lead = max_lead
+        self._processed = 0.
+        # time at which the recognizer has reported progress last
+        self._progress_time = None
+        self._stopped = False
+        self._condition = threading.Condition()
+        self.statistics = FeedStatistics()
+
+    def attach(self, recognizer):
+        """tracks the audio processed by `recognizer` through its session events and its
+        recognizing and recognized events, which include results without a match"""
+        recognizer.session_started.connect(self._on_started)
+        recognizer.recognizing.connect(self._on_result)
+        recognizer.recognized.connect(self._on_result)
+        recognizer.session_stopped.connect(self._on_stopped)
+        recognizer.canceled.connect(self._on_stopped)
+
+    def _on_started(self, evt):
+        with self._condition:
+            self._progress_time = time.perf_counter()
+
+    def _on_result(self, evt):
+        # offset and duration are in ticks of 100 ns
+        offset = getattr(evt.result, 'offset', None)
+        if offset is not None:
+            self.processed((offset + evt.result.duration) / 1e7)
+
+    def _on_stopped(self, evt):
+        # nothing will be processed anymore, do not wait for it
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+    def processed(self, seconds):
+        """records that the recognizer has processed the first `seconds` of audio"""
+        with self._condition:
+            self._progress_time = time.perf_counter()
+            if seconds > self._processed:
+                self._processed = seconds
+                self._condition.notify_all()
+
+    def _wait_for_recognizer(self, written_seconds):
+        start = time.perf_counter()
+        with self._condition:
+            if self._progress_time is None:
+                self._progress_time = start
+            while not self._stopped:
+                # the audio processed since the last progress is estimated from the elapsed time,
+                # so that silence, for which no results are sent, does not stop the feeding
+                estimated = self._processed + time.perf_counter() - self._progress_time
+                lead = written_seconds - estimated
+                if lead <= self._max_lead:
+                    break
+                self._condition.wait(lead - self._max_lead)
+        self.statistics.backpressure_seconds += time.perf_counter() - start
+
+    def feed(self, callback):
+        """reads the audio of the pull stream callback `callback`, e.g. one returned by
+        `open_wav_callback`, writes it to the stream, and closes the stream at the end. Returns
+        the `FeedStatistics`."""
+        statistics = self.statistics
+        buffer = bytearray(self._chunk_bytes)
+        view = memoryview(buffer)
+        start = time.perf_counter()
+        try:
+            while True:
+                size = callback.read(view)
+                if not size:
+                    break
+
+                if self._speed:
+                    # the time at which the audio would have arrived from a source at the pace
+                    scheduled = start + statistics.bytes / self._bytes_per_second / self._speed
+                    delay = scheduled - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                    drift = max(0., time.perf_counter() - scheduled)
+                    statistics.max_drift = max(statistics.max_drift, drift)
+                    statistics.total_drift += drift
+                if self._max_lead is not None:
+                    self._wait_for_recognizer(statistics.bytes / self._bytes_per_second)
+                if self._stopped:
+                    break
+
+                self._stream.write(bytes(view[:size]))
+                statistics.writes += 1
+                statistics.bytes += size
+        finally:
+            self._stream.close()
+            statistics.audio_seconds = statistics.bytes / self._bytes_per_second
+            statistics.wall_seconds = time.perf_counter() - start
+        return statistics
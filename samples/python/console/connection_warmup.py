@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+"""
+Pre-connection of speech recognizers before audio arrives, and measurement of the time to the
+first partial result
+"""
+
+import threading
+import time
+
+try:
+    import azure.cognitiveservices.speech as speechsdk
+except ImportError:
+    print("""
+    Importing the Speech SDK for Python failed.
+    Refer to
+    https://docs.microsoft.com/azure/cognitive-services/speech-service/quickstart-python for
+    installation instructions.
+    """)
+    import sys
+    sys.exit(1)
+
+
+class ConnectionWarmup(object):
+    """opens the connection of `recognizer` to the service before audio arrives, so that the
+    websocket and authentication handshakes do not delay the recognition of the first words.
+
+    Nothing is sent over the open connection, so the service still closes it after some time
+    without audio. A reconnect loop checks the connection every `reconnect_interval` seconds and
+    opens it again if it has been closed, until `stop` is called, so after a drop the connection
+    may be closed for up to `reconnect_interval` seconds. Pass `for_continuous_recognition=True`
+    for recognizers that are used with continuous or keyword recognition."""
+
+    def __init__(self, recognizer, for_continuous_recognition=False, reconnect_interval=30.):
+        self._connection = speechsdk.Connection.from_recognizer(recognizer)
+        self._for_continuous_recognition = for_continuous_recognition
+        self._reconnect_interval = reconnect_interval
+        self._connected = threading.Event()
+        self._stopped = threading.Event()
+        self._reconnector = None
+        self.opened = None
+        self.connect_time = None
+        self.reconnects = 0
+
+        self._connection.connected.connect(self._on_connected)
+        self._connection.disconnected.connect(self._on_disconnected)
+
+    def _on_connected(self, evt):
+        if self.connect_time is None:
+            self.connect_time = time.perf_counter() - self.opened
+        self._connected.set()
+
+    def _on_disconnected(self, evt):
+        self._connected.clear()
+
+    def start(self):
+        """opens the connection and starts the reconnect loop, returns without waiting for the
+        connection"""
+        self.opened = time.perf_counter()
+        self._connection.open(self._for_continuous_recognition)
+        self._reconnector = threading.Thread(target=self._reconnect_loop, daemon=True)
+        self._reconnector.start()
+        return self
+
+    def wait(self, timeout=None):
+        """waits until the connection is open, returns whether it is"""
+        return self._connected.wait(timeout)
+
+    @property
+    def connected(self):
+        return self._connected.is_set()
+
+    def _reconnect_loop(self):
+        while not self._stopped.wait(self._reconnect_interval):
+            if not self._connected.is_set():
+                self.reconnects += 1
+                try:
+                    self._connection.open(self._for_continuous_recognition)
+                except Exception as ex:
+                    print('Could not open connection: {}'.format(ex))
+
+    def stop(self):
+        """stops the reconnect loop, the connection stays open until the recognizer is done or
+        the service closes it"""
+        self._stopped.set()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+class FirstPartialTimer(object):
+    """measures the time from `start` until the first partial result of `recognizer`. Call
+    `start` when the first audio is written to the recognizer, so that the measurement does not
+    depend on when the audio source starts."""
+
+    def __init__(self, recognizer):
+        self._started = None
+        self.time_to_first_partial = None
+        self.time_to_result = None
+        recognizer.recognizing.connect(self._on_recognizing)
+        recognizer.recognized.connect(self._on_recognized)
+
+    def start(self):
+        self._started = time.perf_counter()
+        self.time_to_first_partial = None
+        self.time_to_result = None
+
+    def _on_recognizing(self, evt):
+        if self._started is not None and self.time_to_first_partial is None:
+            self.time_to_first_partial = time.perf_counter() - self._started
+
+    def _on_recognized(self, evt):
+        if self._started is not None and self.time_to_result is None:
+            self.time_to_result = time.perf_counter() - self._started
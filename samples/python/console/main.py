@@ -18,6 +18,7 @@ samples = OrderedDict([
     (speech_sample, [
         speech_sample.speech_recognize_once_from_mic,
         speech_sample.speech_recognize_once_from_file,
+        speech_sample.speech_recognize_once_from_file_with_warmup,
         speech_sample.speech_recognize_once_compressed_input,
         speech_sample.speech_recognize_once_from_file_with_customized_model,
         speech_sample.speech_recognize_once_from_file_with_custom_endpoint_parameters,
@@ -25,6 +26,7 @@ samples = OrderedDict([
         speech_sample.speech_recognize_continuous_from_file,
         speech_sample.speech_recognition_with_pull_stream,
         speech_sample.speech_recognition_with_push_stream,
+        speech_sample.speech_recognize_once_with_recognizer_pool,
         speech_sample.speech_recognize_keyword_from_microphone,
         speech_sample.speech_recognize_keyword_locally_from_microphone,
         speech_sample.pronunciation_assessment_from_microphone,
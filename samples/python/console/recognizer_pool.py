@@ -0,0 +1,285 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+"""
+Pool of pre-connected speech recognizers that are reused across requests
+"""
+
+import array
+import collections
+import contextlib
+import sys
+import threading
+import time
+
+try:
+    import azure.cognitiveservices.speech as speechsdk
+except ImportError:
+    print("""
+    Importing the Speech SDK for Python failed.
+    Refer to
+    https://docs.microsoft.com/azure/cognitive-services/speech-service/quickstart-python for
+    installation instructions.
+    """)
+    import sys
+    sys.exit(1)
+
+# format of the audio that is written to pooled recognizers: 16 kHz, 16 bit, mono PCM
+SAMPLES_PER_SECOND = 16000
+BYTES_PER_SAMPLE = 2
+# offsets and durations of results are in ticks of 100 nanoseconds
+TICKS_PER_SECOND = 10 ** 7
+# peak amplitude up to which audio that is left in the stream after a result counts as silence
+SILENCE_PEAK = 1000
+
+
+class PooledRecognizer(object):
+    """a speech recognizer that reads from its own push stream, so that it can recognize the
+    audio of many requests over the same connection"""
+
+    def __init__(self, key, speech_config):
+        self.key = key
+        self.stream = speechsdk.audio.PushAudioInputStream(
+            stream_format=speechsdk.audio.AudioStreamFormat(
+                samples_per_second=SAMPLES_PER_SECOND, bits_per_sample=8 * BYTES_PER_SAMPLE, channels=1))
+        self.recognizer = speechsdk.SpeechRecognizer(
+            speech_config=speech_config, audio_config=speechsdk.audio.AudioConfig(stream=self.stream))
+        self.connection = speechsdk.Connection.from_recognizer(self.recognizer)
+        self.connection.connected.connect(self._on_connected)
+        self.connection.disconnected.connect(self._on_disconnected)
+        self.connected = False
+        self.failed = False
+        # whether audio of the last request that may contain speech is left in the stream
+        self.audio_left = False
+        # end of the audio written to the stream in ticks
+        self._position = 0
+        self.uses = 0
+        self.last_used = time.monotonic()
+
+    def _on_connected(self, evt):
+        self.connected = True
+
+    def _on_disconnected(self, evt):
+        self.connected = False
+
+    def open(self):
+        """opens the connection to the service before audio is written, so that the first request
+        does not wait for the connection and authentication"""
+        self.connection.open(False)
+
+    def recognize_once(self, audio, end_silence_ms=1000):
+        """recognizes a single utterance in `audio`, 16 kHz 16 bit mono PCM data without header.
+        `end_silence_ms` milliseconds of silence are written after the audio to mark the end of
+        the utterance, because the stream stays open for the next request.
+
+        Recognition stops at the end of the first utterance, and the rest of the audio stays in
+        the stream. If that rest is not silent, `audio_left` is set and the recognizer is
+        discarded when it is returned to the pool, so that the audio is not recognized as part of
+        the next request."""
+        self.uses += 1
+        start = self._position
+        silence = bytes(SAMPLES_PER_SECOND * BYTES_PER_SAMPLE * end_silence_ms // 1000)
+        result_future = self.recognizer.recognize_once_async()
+        self.stream.write(audio)
+        self.stream.write(silence)
+        self._position += _ticks(len(audio) + len(silence))
+        result = result_future.get()
+
+        if result.reason == speechsdk.ResultReason.Canceled and \
+                result.cancellation_details.reason == speechsdk.CancellationReason.Error:
+            # the recognizer is discarded when it is returned to the pool
+            self.failed = True
+        elif result.reason != speechsdk.ResultReason.RecognizedSpeech:
+            # it is not known how much of the audio has been recognized
+            self.audio_left = True
+        else:
+            # the offset of the result is relative to the start of the stream
+            recognized = (result.offset + result.duration - start) * SAMPLES_PER_SECOND // TICKS_PER_SECOND
+            self.audio_left = not _is_silent(audio[max(0, recognized) * BYTES_PER_SAMPLE:])
+        return result
+
+    def close(self):
+        """closes the connection and the stream of the recognizer"""
+        try:
+            self.connection.close()
+        finally:
+            self.stream.close()
+
+
+def _ticks(size):
+    # duration of `size` bytes of audio in ticks
+    return size * TICKS_PER_SECOND // (SAMPLES_PER_SECOND * BYTES_PER_SAMPLE)
+
+
+def _is_silent(audio):
+    samples = array.array('h', audio[:len(audio) - len(audio) % BYTES_PER_SAMPLE])
+    if sys.byteorder == 'big':
+        # the audio is little-endian
+        samples.byteswap()
+    return max(samples, default=0) <= SILENCE_PEAK and -min(samples, default=0) <= SILENCE_PEAK
+
+
+class RecognizerPool(object):
+    """keeps warm speech recognizers for each combination of language, endpoint and custom model
+    that are checked out for a request and returned afterwards.
+
+    At most `max_size` recognizers are created per combination, further requests wait for a
+    recognizer to be returned. Recognizers that are idle for more than `idle_timeout` seconds are
+    closed, and recognizers are checked before they are handed out: failed recognizers and
+    recognizers with audio of an earlier request left in their stream are replaced, and
+    disconnected ones are connected again."""
+
+    def __init__(self, subscription, region, max_size=4, idle_timeout=300.):
+        self._subscription = subscription
+        self._region = region
+        self._max_size = max_size
+        self._idle_timeout = idle_timeout
+        # idle recognizers per key, the most recently used last
+        self._idle = collections.defaultdict(collections.deque)
+        self._sizes = collections.Counter()
+        self._condition = threading.Condition()
+        self._closed = threading.Event()
+        self.stats = collections.Counter()
+
+        self._evictor = threading.Thread(target=self._evict_periodically, daemon=True)
+        self._evictor.start()
+
+    def _speech_config(self, key):
+        language, endpoint, model = key
+        if endpoint is not None:
+            speech_config = speechsdk.SpeechConfig(subscription=self._subscription, endpoint=endpoint)
+        else:
+            speech_config = speechsdk.SpeechConfig(subscription=self._subscription, region=self._region)
+        speech_config.speech_recognition_language = language
+        if model is not None:
+            speech_config.endpoint_id = model
+        return speech_config
+
+    def _create(self, key):
+        recognizer = PooledRecognizer(key, self._speech_config(key))
+        recognizer.open()
+        self.stats['created'] += 1
+        return recognizer
+
+    def _discard(self, recognizer, discarded):
+        # must be called with the condition held, the recognizer is added to `discarded` to be
+        # closed by `_close` after the condition has been released
+        self._sizes[recognizer.key] -= 1
+        self._condition.notify_all()
+        discarded.append(recognizer)
+
+    @staticmethod
+    def _close(discarded):
+        for recognizer in discarded:
+            try:
+                recognizer.close()
+            except Exception as ex:
+                print('Could not close recognizer: {}'.format(ex))
+
+    def checkout(self, language="en-US", endpoint=None, model=None, timeout=None):
+        """returns a recognizer for `language`, the `endpoint` url, and the endpoint id of a
+        custom `model`, waiting at most `timeout` seconds for a free recognizer"""
+        key = (language, endpoint, model)
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        discarded = []
+        try:
+            with self._condition:
+                while True:
+                    if self._closed.is_set():
+                        raise RuntimeError('the recognizer pool is closed')
+                    idle = self._idle[key]
+                    while idle:
+                        recognizer = idle.pop()
+                        if not recognizer.failed:
+                            break
+                        self.stats['unhealthy'] += 1
+                        self._discard(recognizer, discarded)
+                    else:
+                        recognizer = None
+
+                    if recognizer is not None:
+                        self.stats['reused'] += 1
+                        break
+                    if self._sizes[key] < self._max_size:
+                        # the recognizer is created outside of the lock
+                        self._sizes[key] += 1
+                        break
+
+                    remaining = deadline - time.monotonic() if deadline is not None else None
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError('no recognizer for {} available'.format(key))
+                    self._condition.wait(remaining)
+        finally:
+            self._close(discarded)
+
+        if recognizer is None:
+            try:
+                return self._create(key)
+            except Exception:
+                with self._condition:
+                    self._sizes[key] -= 1
+                    self._condition.notify_all()
+                raise
+
+        if not recognizer.connected:
+            # the service closes idle connections, open it again before the audio arrives
+            self.stats['reconnected'] += 1
+            recognizer.open()
+        return recognizer
+
+    def checkin(self, recognizer):
+        """returns a recognizer that has been checked out to the pool"""
+        recognizer.last_used = time.monotonic()
+        discarded = []
+        with self._condition:
+            if recognizer.audio_left:
+                self.stats['audio_left'] += 1
+            if recognizer.failed or recognizer.audio_left or self._closed.is_set():
+                self._discard(recognizer, discarded)
+            else:
+                self._idle[recognizer.key].append(recognizer)
+                self._condition.notify_all()
+        self._close(discarded)
+
+    @contextlib.contextmanager
+    def recognizer(self, language="en-US", endpoint=None, model=None, timeout=None):
+        """context manager that checks out a recognizer and returns it afterwards"""
+        recognizer = self.checkout(language, endpoint, model, timeout)
+        try:
+            yield recognizer
+        finally:
+            self.checkin(recognizer)
+
+    def prewarm(self, count, language="en-US", endpoint=None, model=None):
+        """creates and connects up to `count` recognizers before the first request"""
+        recognizers = [self.checkout(language, endpoint, model) for _ in range(min(count, self._max_size))]
+        for recognizer in recognizers:
+            self.checkin(recognizer)
+
+    def evict_idle(self):
+        """closes the recognizers that have been idle for longer than the idle timeout"""
+        now = time.monotonic()
+        discarded = []
+        with self._condition:
+            for idle in self._idle.values():
+                # the least recently used recognizers are at the front
+                while idle and now - idle[0].last_used > self._idle_timeout:
+                    self.stats['evicted'] += 1
+                    self._discard(idle.popleft(), discarded)
+        self._close(discarded)
+
+    def _evict_periodically(self):
+        while not self._closed.wait(self._idle_timeout / 2):
+            self.evict_idle()
+
+    def close(self):
+        """closes all idle recognizers, checked out recognizers are closed when they are returned"""
+        self._closed.set()
+        discarded = []
+        with self._condition:
+            for idle in self._idle.values():
+                while idle:
+                    self._discard(idle.popleft(), discarded)
+        self._close(discarded)
@@ -23,6 +23,10 @@ except ImportError:
     import sys
     sys.exit(1)
 
+import audio_stream
+import connection_warmup
+import recognizer_pool
+
 
 # Set up the subscription info for the Speech Service:
 # Replace with your own subscription key and service region (e.g., "westus").
@@ -93,6 +97,57 @@ def speech_recognize_once_from_file():
     # </SpeechRecognitionWithFile>
 
 
+def speech_recognize_once_from_file_with_warmup():
+    """performs one-shot speech recognition of the same audio file with and without opening the
+    connection to the service beforehand, and compares the time to the first partial result"""
+    speech_config = speechsdk.SpeechConfig(subscription=speech_key, region=service_region)
+
+    for warm in (False, True):
+        # The audio is written to a push stream in real time, like from a live source, so that
+        # both runs receive the same audio at the same pace.
+        stream = speechsdk.audio.PushAudioInputStream()
+        audio_config = speechsdk.audio.AudioConfig(stream=stream)
+        speech_recognizer = speechsdk.SpeechRecognizer(speech_config=speech_config, audio_config=audio_config)
+        timer = connection_warmup.FirstPartialTimer(speech_recognizer)
+
+        warmup = None
+        if warm:
+            # Opens the connection while the application is waiting for audio, e.g. when a
+            # microphone button is shown, so that recognition starts as soon as audio arrives.
+            warmup = connection_warmup.ConnectionWarmup(speech_recognizer).start()
+            if warmup.wait(timeout=10):
+                print('Connected in {:.3f}s'.format(warmup.connect_time))
+
+        # feeding stops when the recognition ends after the first utterance
+        feeder = audio_stream.PushStreamFeeder(stream, speed=1.)
+        feeder.attach(speech_recognizer)
+        callback = audio_stream.open_wav_callback(weatherfilename)
+        try:
+            result_future = speech_recognizer.recognize_once_async()
+            # the feeder writes the first chunk as soon as it starts
+            timer.start()
+            feeder.feed(callback)
+            result = result_future.get()
+        finally:
+            callback.close()
+            if warmup is not None:
+                warmup.stop()
+
+        if result.reason == speechsdk.ResultReason.RecognizedSpeech:
+            print("Recognized: {}".format(result.text))
+        elif result.reason == speechsdk.ResultReason.NoMatch:
+            print("No speech could be recognized")
+        elif result.reason == speechsdk.ResultReason.Canceled:
+            cancellation_details = result.cancellation_details
+            print("Speech Recognition canceled: {}".format(cancellation_details.reason))
+            if cancellation_details.reason == speechsdk.CancellationReason.Error:
+                print("Error details: {}".format(cancellation_details.error_details))
+
+        if timer.time_to_first_partial is not None:
+            print('Time to first partial result with {} connection: {:.3f}s'.format(
+                'pre-opened' if warm else 'new', timer.time_to_first_partial))
+
+
 def speech_recognize_once_compressed_input():
     """performs one-shot speech recognition with compressed input from an audio file"""
     # <SpeechRecognitionWithCompressedFile>
@@ -335,53 +390,29 @@ def speech_recognize_keyword_from_microphone():
     speech_recognizer.session_stopped.connect(stop_cb)
     speech_recognizer.canceled.connect(stop_cb)
 
+    # Open the connection to the service while waiting for the keyword and keep it open, so that
+    # the speech following the keyword is not delayed by the connection setup
+    warmup = connection_warmup.ConnectionWarmup(speech_recognizer, for_continuous_recognition=True).start()
+
     # Start keyword recognition
     speech_recognizer.start_keyword_recognition(model)
     print('Say something starting with "{}" followed by whatever you want...'.format(keyword))
     while not done:
         time.sleep(.5)
 
+    warmup.stop()
     speech_recognizer.stop_keyword_recognition()
 
 def speech_recognition_with_pull_stream():
     """gives an example how to use a pull audio stream to recognize speech from a custom audio
     source"""
-    class WavFileReaderCallback(speechsdk.audio.PullAudioInputStreamCallback):
-        """Example class that implements the Pull Audio Stream interface to recognize speech from
-        an audio file"""
-        def __init__(self, filename: str):
-            super().__init__()
-            self._file_h = wave.open(filename, mode=None)
-
-            self.sample_width = self._file_h.getsampwidth()
-
-            assert self._file_h.getnchannels() == 1
-            assert self._file_h.getsampwidth() == 2
-            assert self._file_h.getframerate() == 16000
-            assert self._file_h.getcomptype() == 'NONE'
-
-        def read(self, buffer: memoryview) -> int:
-            """read callback function"""
-            size = buffer.nbytes
-            frames = self._file_h.readframes(size // self.sample_width)
-
-            buffer[:len(frames)] = frames
-
-            return len(frames)
-
-        def close(self):
-            """close callback function"""
-            self._file_h.close()
-
     speech_config = speechsdk.SpeechConfig(subscription=speech_key, region=service_region)
 
-    # specify the audio format
-    wave_format = speechsdk.audio.AudioStreamFormat(samples_per_second=16000, bits_per_sample=16,
-            channels=1)
-
-    # setup the audio stream
-    callback = WavFileReaderCallback(weatherfilename)
-    stream = speechsdk.audio.PullAudioInputStream(callback, wave_format)
+    # setup the audio stream. The callback implements the Pull Audio Stream interface and reads
+    # the audio data from the memory-mapped file, see audio_stream.py. Files that are not 16 kHz
+    # 16 bit mono PCM are converted to this format while reading.
+    callback = audio_stream.open_wav_callback(weatherfilename)
+    stream = speechsdk.audio.PullAudioInputStream(callback, callback.stream_format())
     audio_config = speechsdk.audio.AudioConfig(stream=stream)
 
     # instantiate the speech recognizer with pull stream input
@@ -433,29 +464,78 @@ def speech_recognition_with_push_stream():
     speech_recognizer.session_stopped.connect(lambda evt: print('SESSION STOPPED {}'.format(evt)))
     speech_recognizer.canceled.connect(lambda evt: print('CANCELED {}'.format(evt)))
 
-    # The number of bytes to push per buffer
-    n_bytes = 3200
-    wav_fh = wave.open(weatherfilename)
+    done = False
+
+    def stop_cb(evt):
+        """callback that signals to stop continuous recognition upon receiving an event `evt`"""
+        print('CLOSING on {}'.format(evt))
+        nonlocal done
+        done = True
+
+    speech_recognizer.session_stopped.connect(stop_cb)
+    speech_recognizer.canceled.connect(stop_cb)
+
+    # The feeder writes the audio in chunks of 100 ms. With speed=1. it writes them in real time,
+    # like a live source, with speed=10. ten times faster, and with speed=None as fast as the
+    # recognizer processes them, at most max_lead seconds ahead of the recognition.
+    feeder = audio_stream.PushStreamFeeder(stream, speed=1., chunk_seconds=.1, max_lead=5.)
+    feeder.attach(speech_recognizer)
+
+    # open the file before starting recognition, so that a missing or invalid file does not leave
+    # the recognition running
+    callback = audio_stream.open_wav_callback(weatherfilename)
 
     # start continuous speech recognition
     speech_recognizer.start_continuous_recognition()
 
-    # start pushing data until all data has been read from the file
+    # push data until all data has been read from the file, the stream is closed at the end
     try:
-        while(True):
-            frames = wav_fh.readframes(n_bytes // 2)
-            print('read {} bytes'.format(len(frames)))
-            if not frames:
-                break
-
-            stream.write(frames)
-            time.sleep(.1)
+        statistics = feeder.feed(callback)
+        print('Feeding statistics: {}'.format(statistics))
+
+        # wait until the recognizer has processed the rest of the stream
+        while not done:
+            time.sleep(.5)
     finally:
         # stop recognition and clean up
-        wav_fh.close()
-        stream.close()
+        callback.close()
         speech_recognizer.stop_continuous_recognition()
 
+
+def speech_recognize_once_with_recognizer_pool():
+    """performs one-shot speech recognition of several requests with recognizers from a pool of
+    pre-connected recognizers"""
+    # The pool creates the recognizers and connects them to the service ahead of the requests, so
+    # the requests do not wait for the connection and authentication.
+    pool = recognizer_pool.RecognizerPool(speech_key, service_region, max_size=2)
+    pool.prewarm(2, language="en-US")
+
+    # The audio of the requests, 16 kHz 16 bit mono PCM data without header
+    with wave.open(weatherfilename) as wav_fh:
+        audio = wav_fh.readframes(wav_fh.getnframes())
+
+    try:
+        for request in range(4):
+            start = time.perf_counter()
+            with pool.recognizer(language="en-US") as pooled:
+                result = pooled.recognize_once(audio)
+            print('Request {} took {:.3f}s'.format(request, time.perf_counter() - start))
+
+            # Check the result
+            if result.reason == speechsdk.ResultReason.RecognizedSpeech:
+                print("Recognized: {}".format(result.text))
+            elif result.reason == speechsdk.ResultReason.NoMatch:
+                print("No speech could be recognized: {}".format(result.no_match_details))
+            elif result.reason == speechsdk.ResultReason.Canceled:
+                cancellation_details = result.cancellation_details
+                print("Speech Recognition canceled: {}".format(cancellation_details.reason))
+                if cancellation_details.reason == speechsdk.CancellationReason.Error:
+                    print("Error details: {}".format(cancellation_details.error_details))
+    finally:
+        print('Pool statistics: {}'.format(dict(pool.stats)))
+        pool.close()
+
+
 def speech_recognize_once_with_auto_language_detection_from_mic():
     """performs one-shot speech recognition from the default microphone with auto language detection"""
     speech_config = speechsdk.SpeechConfig(subscription=speech_key, region=service_region)